@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Time the sputils cli end to end against the fake api server.
+
+Each case runs sputils in a fresh process with an empty cache directory,
+for every worker count, and reports wall time, api requests per second,
+throttled requests and the process' peak memory.
+
+Run from the repository root, or anywhere with sputils installed:
+
+    PYTHONPATH=. python benchmarks/bench_api.py --albums 2000 \\
+        --latency 0.05 --workers 1,8,32,64
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_api
+
+CASES = {
+    'collect albums': ['-a', 'collect', '-r', 'albums'],
+    'collect tracks': ['-a', 'collect', '-r', 'tracks'],
+    'collect playlists': ['-a', 'collect', '-r', 'playlists'],
+    'following albums': ['-a', 'following', '-r', 'albums'],
+    'search albums': ['-a', 'search', '-r', 'albums', '--max_results',
+                      '1000', 'benchmark'],
+    'search tracks': ['-a', 'search', '-r', 'tracks', '--max_results',
+                      '1000', 'benchmark'],
+}
+
+
+def worker_counts(value):
+    return [int(w) for w in value.split(',') if w.strip()]
+
+
+def run_cli(cli_args, env):
+    """ Run sputils, returning its wall time and peak rss in bytes
+
+    RUSAGE_CHILDREN only keeps the largest peak of every child waited for,
+    so a run that uses less memory than an earlier one reports that
+    earlier peak.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'sputils', *cli_args],
+                            env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+    _, stderr = proc.communicate()
+    elapsed = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError(f'sputils {" ".join(cli_args)} failed:\n'
+                           f'{stderr.decode()}')
+
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    scale = 1 if sys.platform == 'darwin' else 1024
+    rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return elapsed, rusage.ru_maxrss * scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    fake_api.add_server_args(parser)
+    parser.add_argument('--workers', type=worker_counts, default=[1, 8, 32],
+                        help='comma separated --max_concurrency values')
+    parser.add_argument('--cases', type=lambda v: v.split(','),
+                        default=list(CASES),
+                        help='comma separated cases to run '
+                             f'({", ".join(CASES)})')
+    parser.add_argument('--engine', choices=['thread', 'async'],
+                        default='thread')
+    args = parser.parse_args()
+
+    server = fake_api.server_from_args(args)
+
+    print(f'{args.albums} albums, {args.playlists} playlists, '
+          f'latency {args.latency}s, rate {args.rate or "unlimited"}, '
+          f'throttle {args.throttle}, engine {args.engine}')
+    print(f'{"case":20} {"workers":>7} {"wall s":>8} {"requests":>8} '
+          f'{"req/s":>8} {"429s":>6} {"peak MB":>8}')
+
+    for case in args.cases:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as home:
+                env = dict(os.environ, HOME=home,
+                           SPUTILS_API_PREFIX=server.prefix,
+                           SPUTILS_ACCESS_TOKEN='benchmark')
+                cli_args = ['-u', 'bench', '--client_id', 'x',
+                            '--client_secret', 'x', '--no_daemon',
+                            '--no_cache', '--engine', args.engine,
+                            '--max_concurrency', str(workers),
+                            *CASES[case]]
+
+                server.reset_stats()
+                elapsed, peak = run_cli(cli_args, env)
+                stats = dict(server.stats)
+
+            requests = stats.get('requests', 0)
+            print(f'{case:20} {workers:7} {elapsed:8.2f} {requests:8} '
+                  f'{requests / elapsed:8.1f} {stats.get(429, 0):6} '
+                  f'{peak / 2 ** 20:8.1f}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
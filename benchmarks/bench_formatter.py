@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Time sputils' output formats on a synthetic library of collected tracks.
+
+Run from the repository root, or anywhere with sputils installed:
+
+    PYTHONPATH=. python benchmarks/bench_formatter.py --size 100000
+"""
+
+import argparse
+import io
+import time
+
+import yaml
+
+from sputils import common, records
+
+
+def synthetic_tracks(size, album_size=12):
+    """ Build size collected tracks, spread over albums of album_size """
+    tracks = []
+    for n in range(0, size, album_size):
+        artists = records.shared_artists(
+            [(f'artist {n % 500}', f'spotify:artist:{n % 500}')])
+        album_tracks = [
+            records.Track(f'artist {n % 500}', common.track_number(1, i + 1),
+                          f'track {n + i}', f'spotify:track:{n + i}',
+                          artists)
+            for i in range(min(album_size, size - n))]
+        album = records.CollectedAlbum(
+            f'artist {n % 500}', f'album {n}', f'spotify:album:{n}',
+            f'https://i.scdn.co/image/{n}', f'spotify:artist:{n % 500}',
+            '2019-06-01T00:00:00Z', album_tracks, artists)
+        tracks += [records.CollectedTrack(t, album) for t in album_tracks]
+
+    return tracks
+
+
+def timed(func):
+    start = time.perf_counter()
+    out = func()
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000,
+                        help='number of tracks in the library')
+    parser.add_argument('--yaml', action='store_true',
+                        help='include the (slow) yaml formats')
+    args = parser.parse_args()
+
+    tracks = synthetic_tracks(args.size)
+
+    cases = [
+        ('json, indented', 'json', False),
+        ('json, compact', 'json', True),
+        ('ndjson', 'ndjson', False),
+        ('lines', 'lines', False),
+    ]
+    if args.yaml:
+        cases.append(('yaml', 'yaml', False))
+
+    print(f'{args.size} tracks, orjson: {common.get_orjson() is not None}, '
+          f'yaml dumper: {common.yaml_dumper().__name__}')
+    print(f'{"format":<16}{"formatter":>12}{"streamed":>12}{"MB":>8}')
+
+    for name, output_format, compact in cases:
+        elapsed, out = timed(lambda: common.formatter(
+            tracks, output_format, '{artist} - {name}', compact))
+        streamed, _ = timed(lambda: common.write_formatted(
+            tracks, output_format, '{artist} - {name}', io.StringIO(),
+            compact))
+        print(f'{name:<16}{elapsed:>11.2f}s{streamed:>11.2f}s'
+              f'{len(out) / 1e6:>8.1f}')
+
+    if args.yaml and common.yaml_dumper() is not yaml.SafeDumper:
+        data = records.builtin_value(tracks)
+        elapsed, _ = timed(lambda: yaml.dump(data, Dumper=yaml.SafeDumper))
+        print(f'{"yaml, python":<16}{elapsed:>11.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+"""Serve a synthetic library over the parts of the Spotify api sputils uses.
+
+Pages, ids and shapes follow the real api closely enough for sputils'
+collectors, searchers and library changes. Latency, rate limiting and
+random 429s can be injected, and every response carries an ETag that
+If-None-Match requests are checked against.
+
+    python benchmarks/fake_api.py --albums 2000 --latency 0.05 --rate 200
+
+Point sputils at it with:
+
+    SPUTILS_API_PREFIX=http://127.0.0.1:8099/v1/ SPUTILS_ACCESS_TOKEN=fake \\
+        sputils -u bench --client_id x --client_secret x --no_daemon
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import math
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+SEARCH_OFFSET_LIMIT = 1000
+
+
+def album_id(n):
+    return f'album{n:07d}'
+
+
+def track_id(n, i):
+    return f'track{n:07d}x{i:03d}'
+
+
+class Library:
+    """ A deterministic synthetic catalog and saved library """
+
+    def __init__(self, albums=1000, playlists=100, artists=None, seed=0):
+        rnd = random.Random(seed)
+        self.artist_count = artists or max(1, albums // 5)
+        self.album_sizes = [rnd.choice([rnd.randint(5, 30)] * 49 +
+                                       [rnd.randint(51, 150)])
+                            for _ in range(albums)]
+        self.playlist_sizes = [rnd.randint(1, 500) for _ in range(playlists)]
+        self.saved = {
+            'albums': {album_id(n) for n in range(albums)},
+            'tracks': set(),
+        }
+        self.lock = threading.Lock()
+
+    def artist(self, n):
+        n %= self.artist_count
+        return {'name': f'artist {n}', 'uri': f'spotify:artist:artist{n:07d}',
+                'id': f'artist{n:07d}', 'type': 'artist'}
+
+    def image(self, key):
+        return [{'url': f'https://i.scdn.co/image/{key}', 'height': 640,
+                 'width': 640}]
+
+    def album_stub(self, n):
+        return {
+            'name': f'album {n}',
+            'id': album_id(n),
+            'uri': f'spotify:album:{album_id(n)}',
+            'artists': [self.artist(n)],
+            'images': self.image(album_id(n)),
+            'release_date': f'{1960 + n % 60}-01-01',
+            'total_tracks': self.album_sizes[n],
+        }
+
+    def track(self, n, i, album=False):
+        track = {
+            'name': f'track {i + 1} of album {n}',
+            'id': track_id(n, i),
+            'uri': f'spotify:track:{track_id(n, i)}',
+            'artists': [self.artist(n), self.artist(n + i + 1)][:1 + i % 2],
+            'disc_number': 1 + i // 100,
+            'track_number': 1 + i % 100,
+        }
+        if album:
+            track['album'] = self.album_stub(n)
+        return track
+
+    def playlist(self, n):
+        return {
+            'name': f'playlist {n}',
+            'id': f'playlist{n:07d}',
+            'uri': f'spotify:playlist:playlist{n:07d}',
+            'images': self.image(f'playlist{n:07d}'),
+            'tracks': {'total': self.playlist_sizes[n]},
+        }
+
+
+def parse_id(value, prefix):
+    """ Return the index encoded in a fake id, or None """
+    value = value.split(':')[-1]
+    if not value.startswith(prefix):
+        return None
+    try:
+        return int(value[len(prefix):].split('x')[0])
+    except ValueError:
+        return None
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def library(self):
+        return self.server.library
+
+    def base_url(self):
+        return f'http://{self.headers["Host"]}/v1/'
+
+    def page(self, path, items, total, limit, offset, **params):
+        """ Build a paging object, with next pointing back at this server """
+        page = {'items': items, 'total': total, 'limit': limit,
+                'offset': offset, 'next': None}
+        if offset + limit < total:
+            query = urllib.parse.urlencode({**params, 'limit': limit,
+                                            'offset': offset + limit})
+            page['next'] = f'{self.base_url()}{path}?{query}'
+        return page
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        etag = '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+        self.server.count(status)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {'error': {'status': status,
+                                          'message': message}}, headers)
+
+    def handle_method(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        path = url.path[len('/v1/'):].strip('/') \
+            if url.path.startswith('/v1/') else None
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        if path is None:
+            return self.send_error_json(404, 'not found')
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self.send_error_json(401, 'no token provided')
+
+        delay = self.server.throttle()
+        if delay is not None:
+            return self.send_error_json(429, 'rate limit exceeded',
+                                        {'Retry-After': str(delay)})
+
+        if self.server.latency:
+            time.sleep(self.server.latency * random.uniform(0.5, 1.5))
+
+        handler = getattr(self, f'{method}_' + path.replace('/', '_'), None)
+        parts = path.split('/')
+        if method == 'get' and len(parts) == 3 and parts[0] == 'albums':
+            return self.get_album_tracks(parts[1], params)
+        if method == 'get' and len(parts) == 3 and parts[0] == 'artists':
+            return self.get_artist_albums(parts[1], params)
+        if method == 'get' and len(parts) == 4 and parts[0] == 'users':
+            return self.get_playlist(parts[3], params)
+        if handler is None:
+            return self.send_error_json(404, 'not found')
+
+        handler(params)
+
+    def do_GET(self):
+        self.handle_method('get')
+
+    def do_PUT(self):
+        self.handle_method('put')
+
+    def do_DELETE(self):
+        self.handle_method('delete')
+
+    def limit_offset(self, params, default=20, maximum=50):
+        limit = min(int(params.get('limit', default)), maximum)
+        return limit, int(params.get('offset', 0))
+
+    def get_me_albums(self, params):
+        limit, offset = self.limit_offset(params)
+        albums = len(self.library.album_sizes)
+        with self.library.lock:
+            saved = [parse_id(i, 'album')
+                     for i in self.library.saved['albums']]
+        saved = sorted((n for n in saved if n is not None and n < albums),
+                       reverse=True)
+
+        items = []
+        for n in saved[offset:offset + limit]:
+            album = self.library.album_stub(n)
+            size = self.library.album_sizes[n]
+            album['tracks'] = self.page(
+                f'albums/{album_id(n)}/tracks',
+                [self.library.track(n, i) for i in range(min(size, 50))],
+                size, 50, 0)
+            # the newest saves come first
+            added = time.gmtime(1.5e9 + n * 3600)
+            items.append({'added_at': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                                    added),
+                          'album': album})
+
+        self.send_json(200, self.page('me/albums', items, len(saved), limit,
+                                      offset))
+
+    def get_album_tracks(self, album, params):
+        n = parse_id(album, 'album')
+        if n is None or n >= len(self.library.album_sizes):
+            return self.send_error_json(404, 'non existing id')
+
+        limit, offset = self.limit_offset(params)
+        size = self.library.album_sizes[n]
+        items = [self.library.track(n, i)
+                 for i in range(offset, min(size, offset + limit))]
+        self.send_json(200, self.page(f'albums/{album_id(n)}/tracks', items,
+                                      size, limit, offset))
+
+    def get_me_following(self, params):
+        # every artist is followed, paged by cursor rather than offset
+        limit = min(int(params.get('limit', 20)), 50)
+        after = parse_id(params.get('after', ''), 'artist')
+        start = 0 if after is None else after + 1
+        total = self.library.artist_count
+
+        items = [self.library.artist(n)
+                 for n in range(start, min(total, start + limit))]
+        page = {'items': items, 'total': total, 'limit': limit,
+                'next': None, 'cursors': {'after': None}}
+        if start + limit < total:
+            after = items[-1]['id']
+            query = urllib.parse.urlencode({'type': 'artist', 'limit': limit,
+                                            'after': after})
+            page['next'] = f'{self.base_url()}me/following?{query}'
+            page['cursors']['after'] = after
+        self.send_json(200, {'artists': page})
+
+    def get_artist_albums(self, artist, params):
+        n = parse_id(artist, 'artist')
+        if n is None or n >= self.library.artist_count:
+            return self.send_error_json(404, 'non existing id')
+
+        limit, offset = self.limit_offset(params)
+        albums = range(n, len(self.library.album_sizes),
+                       self.library.artist_count)[::-1]
+        items = [{**self.library.album_stub(a), 'album_type': 'album'}
+                 for a in albums[offset:offset + limit]]
+        self.send_json(200, self.page(f'artists/{artist}/albums', items,
+                                      len(albums), limit, offset))
+
+    def get_me_playlists(self, params):
+        limit, offset = self.limit_offset(params)
+        total = len(self.library.playlist_sizes)
+        items = [self.library.playlist(n)
+                 for n in range(offset, min(total, offset + limit))]
+        self.send_json(200, self.page('me/playlists', items, total, limit,
+                                      offset))
+
+    def get_playlist(self, playlist, params):
+        n = parse_id(playlist, 'playlist')
+        if n is None or n >= len(self.library.playlist_sizes):
+            return self.send_error_json(404, 'non existing id')
+        self.send_json(200, self.library.playlist(n))
+
+    def lookup(self, params, prefix, count, build):
+        found = []
+        for value in params.get('ids', '').split(','):
+            n = parse_id(value, prefix)
+            valid = n is not None and n < count
+            found.append(build(n, value) if valid else None)
+        return found
+
+    def get_albums(self, params):
+        def build(n, value):
+            album = self.library.album_stub(n)
+            album['tracks'] = self.page(
+                f'albums/{album_id(n)}/tracks',
+                [self.library.track(n, i)
+                 for i in range(min(self.library.album_sizes[n], 50))],
+                self.library.album_sizes[n], 50, 0)
+            return album
+        self.send_json(200, {'albums': self.lookup(
+            params, 'album', len(self.library.album_sizes), build)})
+
+    def get_tracks(self, params):
+        def build(n, value):
+            i = int(value.split('x')[-1])
+            return self.library.track(n, i, album=True)
+        self.send_json(200, {'tracks': self.lookup(
+            params, 'track', len(self.library.album_sizes), build)})
+
+    def get_artists(self, params):
+        def build(n, value):
+            return self.library.artist(n)
+        self.send_json(200, {'artists': self.lookup(
+            params, 'artist', self.library.artist_count, build)})
+
+    def get_search(self, params):
+        limit, offset = self.limit_offset(params, 10)
+        search_type = params.get('type', 'track')
+        total = self.server.search_total
+        if offset + limit > SEARCH_OFFSET_LIMIT:
+            return self.send_error_json(404, 'offset out of range')
+
+        # every query gets its own, stable, run of the catalog
+        start = int(hashlib.sha1(params.get('q', '').encode()).hexdigest(),
+                    16)
+        albums = len(self.library.album_sizes)
+        indexes = [(start + i) % albums
+                   for i in range(offset, min(total, offset + limit))]
+
+        if search_type == 'album':
+            items = [self.library.album_stub(n) for n in indexes]
+        elif search_type == 'track':
+            items = [self.library.track(n, 0, album=True) for n in indexes]
+        elif search_type == 'artist':
+            items = [self.library.artist(n) for n in indexes]
+        elif search_type == 'playlist':
+            playlists = len(self.library.playlist_sizes)
+            items = [self.library.playlist(n % playlists) for n in indexes]
+        else:
+            return self.send_error_json(400, 'bad search type')
+
+        self.send_json(200, {f'{search_type}s': self.page(
+            'search', items, total, limit, offset,
+            q=params.get('q', ''), type=search_type)})
+
+    def request_ids(self, params):
+        return [i.split(':')[-1] for i in params.get('ids', '').split(',')
+                if i]
+
+    def contains(self, resource, params):
+        saved = self.library.saved[resource]
+        with self.library.lock:
+            found = [i in saved for i in self.request_ids(params)]
+        self.send_json(200, found)
+
+    def change(self, resource, params, save):
+        saved = self.library.saved[resource]
+        with self.library.lock:
+            if save:
+                saved.update(self.request_ids(params))
+            else:
+                saved.difference_update(self.request_ids(params))
+        self.send_json(200, {})
+
+    def get_me_albums_contains(self, params):
+        self.contains('albums', params)
+
+    def get_me_tracks_contains(self, params):
+        self.contains('tracks', params)
+
+    def put_me_albums(self, params):
+        self.change('albums', params, True)
+
+    def delete_me_albums(self, params):
+        self.change('albums', params, False)
+
+    def put_me_tracks(self, params):
+        self.change('tracks', params, True)
+
+    def delete_me_tracks(self, params):
+        self.change('tracks', params, False)
+
+
+class FakeApiServer(socketserver.ThreadingMixIn, HTTPServer):
+    """ Fake api server, counting responses by status
+
+    rate bounds requests per second across all clients, answering the excess
+    with a 429 and a Retry-After of when the next would be accepted, and
+    throttle answers that fraction of requests with a 429 regardless.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, library, latency=0.0, rate=None,
+                 throttle=0.0, retry_after=1, search_total=1000):
+        super().__init__(address, FakeApiHandler)
+        self.library = library
+        self.latency = latency
+        self.rate = rate
+        self.throttle_fraction = throttle
+        self.retry_after = retry_after
+        self.search_total = search_total
+        self.lock = threading.Lock()
+        self.tokens = rate or 0
+        self.updated = time.monotonic()
+        self.stats = collections.Counter()
+
+    @property
+    def prefix(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1/'
+
+    def count(self, status):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[status] += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+    def throttle(self):
+        """ Return the Retry-After for a throttled request, or None
+
+        Like spotify's, and as spotipy expects, it is in whole seconds.
+        """
+        if random.random() < self.throttle_fraction:
+            return self.retry_after
+        if not self.rate:
+            return None
+
+        # a token bucket holding a second's worth of requests
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return math.ceil((1 - self.tokens) / self.rate)
+            self.tokens -= 1
+            return None
+
+
+def start_server(library, host='127.0.0.1', port=0, **kwargs):
+    """ Start a fake api server on a background thread and return it """
+    server = FakeApiServer((host, port), library, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_server_args(parser):
+    parser.add_argument('--albums', type=int, default=1000,
+                        help='number of saved albums')
+    parser.add_argument('--playlists', type=int, default=100,
+                        help='number of playlists')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='mean seconds added to every response')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second before answering 429')
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help='fraction of requests answered with a 429')
+    parser.add_argument('--retry_after', type=int, default=1,
+                        help='Retry-After seconds for --throttle')
+    parser.add_argument('--search_total', type=int, default=1000,
+                        help='total results for every search')
+
+
+def server_from_args(args, host='127.0.0.1', port=0):
+    library = Library(args.albums, args.playlists)
+    return start_server(library, host, port, latency=args.latency,
+                        rate=args.rate, throttle=args.throttle,
+                        retry_after=args.retry_after,
+                        search_total=args.search_total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, port=args.port)
+    print(f'serving {args.albums} albums on {server.prefix}')
+    try:
+        while True:
+            time.sleep(10)
+            print(dict(server.stats))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
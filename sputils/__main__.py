@@ -1,2 +1,5 @@
+import sys
+
 from .sputils import main
-main()
+
+sys.exit(main())
@@ -0,0 +1,17 @@
+import requests
+
+
+class KeepAliveAdapter(requests.adapters.HTTPAdapter):
+    """ Transport adapter whose pool outlives spotipy's responses
+
+    spotipy 2.4.4 closes r.connection, which is the adapter, after every
+    response, and closing an adapter empties its whole pool. That would
+    open a new connection per request, so close does nothing here and the
+    pool is only closed by close_pool once the session is done with.
+    """
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
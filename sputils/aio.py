@@ -0,0 +1,214 @@
+import asyncio
+import json
+import random
+import time
+
+from . import collect, common, search, stats
+
+API_PREFIX = 'https://api.spotify.com/v1/'
+
+
+class AsyncSpotifyError(Exception):
+    def __init__(self, http_status, msg, headers=None):
+        super().__init__(f'http status: {http_status}, {msg}')
+        self.http_status = http_status
+        self.headers = headers or {}
+
+
+class AsyncSpotify:
+    """ Minimal asyncio spotify client for the endpoints sputils pages
+
+    All requests share one pooled aiohttp session, with the number of
+    requests in flight bounded by max_concurrency. Needs aiohttp, which is
+    only imported once the client is opened.
+
+    token is either an access token or a token manager, which is asked for
+    a fresh token on every request.
+    """
+
+    def __init__(self, token, max_concurrency=50, prefix=API_PREFIX,
+                 timeout=30, retries=5):
+        self.token = token
+        self.max_concurrency = max_concurrency
+        self.prefix = prefix
+        self.timeout = timeout
+        self.retries = retries
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def auth_headers(self):
+        token = self.token
+        if not isinstance(token, str):
+            token = token.get_access_token()
+        return {'Authorization': f'Bearer {token}'}
+
+    async def get(self, path, **params):
+        """ GET an api path, retrying throttled and failed requests """
+        url = path if path.startswith('http') else self.prefix + path
+
+        for attempt in range(self.retries + 1):
+            async with self.semaphore:
+                start = time.perf_counter()
+                async with self.session.get(url, params=params,
+                                            headers=self.auth_headers()) as r:
+                    body = await r.read()
+                stats.emit('request', method='GET', url=str(r.url),
+                           status=r.status,
+                           seconds=time.perf_counter() - start,
+                           bytes=len(body))
+
+            if r.status < 400:
+                return json.loads(body)
+            error = AsyncSpotifyError(r.status, body.decode(errors='replace'),
+                                      dict(r.headers))
+
+            if attempt == self.retries:
+                raise error
+            if error.http_status == 429:
+                delay = float(error.headers.get('Retry-After', 1))
+            elif 500 <= error.http_status < 600:
+                delay = random.uniform(0, 0.5 * 2 ** attempt)
+            else:
+                raise error
+            stats.emit('retry', error=error, attempt=attempt)
+            await asyncio.sleep(delay)
+
+    async def current_user_saved_albums(self, limit=20, offset=0):
+        return await self.get('me/albums', limit=limit, offset=offset)
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        return await self.get('me/playlists', limit=limit, offset=offset)
+
+    async def album_tracks(self, album_id, limit=50, offset=0):
+        album_id = album_id.split(':')[-1]
+        return await self.get(f'albums/{album_id}/tracks', limit=limit,
+                              offset=offset)
+
+    async def search(self, q, limit=10, offset=0, type='track'):
+        return await self.get('search', q=q, limit=limit, offset=offset,
+                              type=type)
+
+
+async def collect_pages(fetch, limit=50):
+    """ Fetch the first page for the total, then every other page at once """
+    first = await fetch(limit, 0)
+
+    args = common.limit_split(first['total'], limit, limit)
+    pages = await asyncio.gather(*(fetch(*a) for a in args))
+
+    return first['items'] + [i for p in pages for i in p['items']]
+
+
+async def complete_album_tracks(sp, api_albums):
+    args = []
+    for api_album in api_albums:
+        tracks = api_album['album']['tracks']
+        if not tracks.get('next'):
+            continue
+
+        splits = common.limit_split(tracks['total'], len(tracks['items']))
+        args += [(api_album, limit, offset) for limit, offset in splits]
+
+    pages = await asyncio.gather(*(
+        sp.album_tracks(a['album']['uri'], limit, offset)
+        for a, limit, offset in args))
+
+    for (api_album, _, _), page in zip(args, pages):
+        api_album['album']['tracks']['items'] += page['items']
+
+    return api_albums
+
+
+async def collect_all_albums(sp, limit=50):
+    api_albums = await collect_pages(sp.current_user_saved_albums, limit)
+    api_albums = await complete_album_tracks(sp, api_albums)
+
+    albums = [collect.album_to_record_collected(a) for a in api_albums]
+    return sorted(albums, key=lambda x: x['added'], reverse=True)
+
+
+async def collect_all_playlists(sp, limit=50):
+    api_playlists = await collect_pages(sp.current_user_playlists, limit)
+
+    return [common.playlist_to_dict(p) for p in api_playlists]
+
+
+async def collect_resources(sp, resources):
+    """ Async counterpart of collect.collect_resources """
+    albums = None
+    if {'albums', 'tracks', 'artists'} & set(resources):
+        albums = await collect_all_albums(sp)
+
+    collected = {}
+    for resource in resources:
+        if resource == 'albums':
+            collected[resource] = albums
+        elif resource == 'tracks':
+            collected[resource] = collect.tracks_from_albums(albums)
+        elif resource == 'artists':
+            collected[resource] = collect.artists_from_albums(albums)
+        elif resource == 'playlists':
+            collected[resource] = await collect_all_playlists(sp)
+        else:
+            raise ValueError(f'{resource} is not a valid collector resource')
+
+    return collected
+
+
+async def searcher(sp, qry, resource, max_results=50):
+    """ Async counterpart of search.searcher, paging up to max_results """
+    if resource not in search.SEARCH_TYPES:
+        raise ValueError(f'{resource} is not a valid search resource')
+
+    search_type, transform = search.SEARCH_TYPES[resource]
+
+    async def fetch(limit, offset):
+        searched = await sp.search(qry, limit=limit, offset=offset,
+                                   type=search_type)
+        return searched[resource]
+
+    first = await fetch(min(50, max_results), 0)
+    pages = search.search_pages(max_results, first.get('total', 0))
+    rest = await asyncio.gather(*(fetch(*a) for a in pages))
+
+    seen = set()
+    return [item for page in [first, *rest]
+            for item in search.transform_page(page, transform, seen)]
+
+
+def run(coro):
+    """ Run a coroutine to completion on a fresh event loop """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def run_collector(token, resources, **client_args):
+    async def helper():
+        async with AsyncSpotify(token, **client_args) as sp:
+            return await collect_resources(sp, resources)
+
+    return run(helper())
+
+
+def run_searcher(token, qry, resource, max_results=50, **client_args):
+    async def helper():
+        async with AsyncSpotify(token, **client_args) as sp:
+            return await searcher(sp, qry, resource, max_results)
+
+    return run(helper())
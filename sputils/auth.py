@@ -1,7 +1,26 @@
 import os
+import threading
+import time
 
-import spotipy
-import spotipy.util
+from . import lazy, stats
+
+adapters = lazy.LazyModule(f'{__package__}.adapters')
+httpcache = lazy.LazyModule(f'{__package__}.httpcache')
+requests = lazy.LazyModule('requests')
+spotipy = lazy.LazyModule('spotipy')
+
+# point sputils at another api, such as the benchmarks' fake server
+API_PREFIX_ENV = 'SPUTILS_API_PREFIX'
+ACCESS_TOKEN_ENV = 'SPUTILS_ACCESS_TOKEN'
+
+# seconds before expiry that access tokens are refreshed, so a request
+# sent just before then doesn't arrive with an expired token
+EXPIRY_MARGIN = 60
+
+
+def api_prefix(default=None):
+    """ Return the api prefix to use instead of spotify's, if any """
+    return os.environ.get(API_PREFIX_ENV, default)
 
 
 def get_api_dict(user, client_id, client_secret):
@@ -11,13 +30,13 @@ def get_api_dict(user, client_id, client_secret):
         'client_id': client_id,
         'client_secret': client_secret,
         'redirect_uri': 'http://localhost',
-        'scope': 'user-library-read',
+        'scope': 'user-library-read user-library-modify user-follow-read',
         'cache_path': os.path.expanduser('~/.cache/sputils/user_cache')
     }
 
 
-def get_spotify_client(user, client_id, client_secret):
-    """ Retrieve a token using api details and return client object """
+def get_token(user, client_id, client_secret):
+    """ Retrieve a token using api details """
 
     api = get_api_dict(user, client_id, client_secret)
 
@@ -26,4 +45,180 @@ def get_spotify_client(user, client_id, client_secret):
     if not token:
         raise RuntimeError('Unable to retrieve authentication token')
 
-    return spotipy.Spotify(auth=token)
+    return token
+
+
+class StaticCredentials:
+    """ A fixed access token, given through the environment """
+
+    def __init__(self, token):
+        self.token = token
+
+    def get_access_token(self):
+        return self.token
+
+
+class UserCredentials:
+    """ Access tokens for the user, refreshed with the cached refresh token """
+
+    def __init__(self, oauth, token_info):
+        self.oauth = oauth
+        self.token_info = token_info
+
+    def expiring(self):
+        return self.token_info['expires_at'] - time.time() < EXPIRY_MARGIN
+
+    def get_access_token(self):
+        # spotipy's own check only counts tokens already past expires_at
+        if self.expiring():
+            token_info = self.oauth.refresh_access_token(
+                self.token_info['refresh_token'])
+            if not token_info:
+                raise RuntimeError('Unable to refresh authentication token')
+            self.token_info = token_info
+
+        return self.token_info['access_token']
+
+
+class TokenManager:
+    """ Thread safe source of access tokens for long running clients
+
+    Spotipy asks its client_credentials_manager for a token before every
+    request, so wrapping the credentials here refreshes expired tokens
+    mid-collection, once, however many worker threads notice.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.lock = threading.Lock()
+
+    def get_access_token(self):
+        with self.lock:
+            return self.credentials.get_access_token()
+
+
+def get_user_credentials(user, client_id, client_secret):
+    """ Return credentials for the user, asking them to auth if needed """
+    api = get_api_dict(user, client_id, client_secret)
+    oauth = spotipy.oauth2.SpotifyOAuth(api['client_id'],
+                                        api['client_secret'],
+                                        api['redirect_uri'],
+                                        scope=api['scope'],
+                                        cache_path=api['cache_path'])
+
+    token_info = oauth.get_cached_token()
+    if not token_info:
+        # runs the interactive flow, leaving the new token in the cache
+        get_token(user, client_id, client_secret)
+        token_info = oauth.get_cached_token()
+    if not token_info:
+        raise RuntimeError('Unable to retrieve authentication token')
+
+    return UserCredentials(oauth, token_info)
+
+
+def get_token_manager(user, client_id, client_secret, catalog_only=False):
+    """ Return a token manager for the user, or for the app alone
+
+    Catalog only clients use the client credentials flow, which needs no
+    user interaction but can't read or change the user's library.
+    """
+    if os.environ.get(ACCESS_TOKEN_ENV):
+        credentials = StaticCredentials(os.environ[ACCESS_TOKEN_ENV])
+    elif catalog_only:
+        credentials = spotipy.oauth2.SpotifyClientCredentials(client_id,
+                                                              client_secret)
+    else:
+        credentials = get_user_credentials(user, client_id, client_secret)
+
+    return TokenManager(credentials)
+
+
+class LazyClient:
+    """ Stand-in for a client that is only created when first used
+
+    Runs answered from local caches never import spotipy, authenticate or
+    open connections.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.client = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        with self.lock:
+            if self.client is None:
+                self.client = self.factory()
+        return getattr(self.client, name)
+
+    def close(self):
+        """ Close the client's connections, if it was ever created """
+        with self.lock:
+            if self.client is not None:
+                close_session(self.client._session)
+
+
+def get_session(pool_size=50, http_cache=None):
+    """ Create a keep-alive session pooling a connection per worker thread
+
+    With an http_cache, GETs are revalidated against the cached responses.
+    """
+    session = requests.Session()
+
+    # spotipy only talks to the api and accounts hosts, but each of the
+    # worker threads needs its own connection to avoid reconnecting
+    pool_args = {'pool_connections': 4, 'pool_maxsize': pool_size}
+    if http_cache is None:
+        adapter = adapters.KeepAliveAdapter(**pool_args)
+    else:
+        adapter = httpcache.CachingAdapter(http_cache, **pool_args)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    session.hooks['response'].append(stats.response_hook)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    })
+
+    return session
+
+
+def close_session(session):
+    """ Close the connections a session from get_session pools """
+    for adapter in set(session.adapters.values()):
+        close_pool = getattr(adapter, 'close_pool', adapter.close)
+        close_pool()
+
+
+def get_once(sp):
+    """ Return a _get for sp making a single attempt per call
+
+    Spotipy's own _get retries throttled and failed GETs with blocking
+    sleeps, printing to stdout as it does, which hides them from the
+    scheduler's retries and rate limiting.
+    """
+    def _get(url, args=None, payload=None, **kwargs):
+        if args:
+            kwargs.update(args)
+        return sp._internal_call('GET', url, payload, kwargs)
+
+    return _get
+
+
+def get_spotify_client(user, client_id, client_secret, pool_size=50,
+                       timeout=None, session=None, catalog_only=False,
+                       token_manager=None, http_cache=None):
+    """ Return a client object that refreshes its token as it expires """
+
+    token_manager = token_manager or get_token_manager(
+        user, client_id, client_secret, catalog_only)
+    session = session or get_session(pool_size, http_cache)
+
+    sp = spotipy.Spotify(client_credentials_manager=token_manager,
+                         requests_session=session, requests_timeout=timeout)
+    sp.prefix = api_prefix(sp.prefix)
+    sp._get = get_once(sp)
+
+    return sp
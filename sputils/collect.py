@@ -1,7 +1,6 @@
-import concurrent.futures
-import itertools
+import os
 
-from . import common
+from . import common, ratelimit, records, snapshot, stats
 
 
 def track_to_dict_collected(api_track):
@@ -22,10 +21,76 @@ def album_to_dict_collected(api_album):
     return {**common_dict, **collected}
 
 
-def collect_albums(sp, limit, offset):
+def track_to_record_collected(api_track):
+    return records.Track(
+        common.join_artists(api_track['artists']),
+        common.track_number(api_track['disc_number'],
+                            api_track['track_number']),
+        api_track['name'],
+        api_track['uri'],
+        common.artist_credits(api_track['artists']))
+
+
+def album_to_record_collected(api_album):
+    album = api_album['album']
+
+    return records.CollectedAlbum(
+        common.join_artists(album['artists']),
+        album['name'],
+        album['uri'],
+        album['images'][0]['url'],
+        album['artists'][0]['uri'],
+        api_album['added_at'],
+        [track_to_record_collected(t) for t in album['tracks']['items']],
+        common.artist_credits(album['artists']))
+
+
+def collect_album_tracks(sp, uri, limit, offset):
+    return sp.album_tracks(uri, limit, offset)['items']
+
+
+def complete_album_tracks(sp, api_albums, scheduler=None):
+    """ Fetch the tracks missing from albums with more than one page of them
+
+    Saved albums only embed their first page of tracks. Albums that fit in
+    that page cost nothing extra; the remaining pages of larger albums are
+    fetched concurrently and appended in place.
+    """
+    args = []
+    for api_album in api_albums:
+        tracks = api_album['album']['tracks']
+        if not tracks.get('next'):
+            continue
+
+        splits = common.limit_split(tracks['total'], len(tracks['items']))
+        args += [(api_album, limit, offset) for limit, offset in splits]
+
+    if not args:
+        return api_albums
+
+    def helper(api_album, limit, offset):
+        uri = api_album['album']['uri']
+        return collect_album_tracks(sp, uri, limit, offset)
+
+    scheduler = scheduler or ratelimit.Scheduler()
+    pages = scheduler.map(helper, args, ordered=True)
+    for (api_album, _, _), items in zip(args, pages):
+        api_album['album']['tracks']['items'] += items
+
+    return api_albums
+
+
+def albums_to_records_collected(sp, api_albums, scheduler=None):
+    api_albums = complete_album_tracks(sp, api_albums, scheduler)
+
+    with stats.phase('transform'):
+        return [album_to_record_collected(a) for a in api_albums]
+
+
+def collect_albums(sp, limit, offset, scheduler=None):
     api_albums = sp.current_user_saved_albums(limit, offset)
 
-    albums = [album_to_dict_collected(a) for a in api_albums['items']]
+    albums = albums_to_records_collected(sp, api_albums['items'], scheduler)
 
     return albums
 
@@ -38,84 +103,352 @@ def collect_playlists(sp, limit, offset):
     return playlists
 
 
-def collect_all_albums(sp, limit=50, workers=50):
-    total_albums = sp.current_user_saved_albums(1)['total']
+def iter_all_albums(sp, limit=50, scheduler=None, ordered=False):
+    scheduler = scheduler or ratelimit.Scheduler()
+    total_albums = scheduler.call(sp.current_user_saved_albums, 1)['total']
 
     args = common.limit_split(total_albums, 0, limit)
 
-    def collector_helper(sp):
-        def f(args):
-            return collect_albums(sp, *args)
-        return f
+    def helper(limit, offset):
+        return sp.current_user_saved_albums(limit, offset)['items']
+
+    # tracks are completed outside of the page requests, which would
+    # otherwise hold their scheduler slots while waiting on more requests
+    for api_albums in scheduler.map(helper, args, ordered):
+        yield from albums_to_records_collected(sp, api_albums, scheduler)
+
+
+def iter_albums_since(sp, since, limit=50, scheduler=None):
+    """ Yield the albums saved at or after since, newest first
+
+    Saved albums come newest first, so pages are fetched one at a time and
+    paging stops at the first album saved before since.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+    offset = 0
+    while True:
+        api_albums = scheduler.call(sp.current_user_saved_albums, limit,
+                                    offset)
+        items = [a for a in api_albums['items'] if a['added_at'] >= since]
+        yield from albums_to_records_collected(sp, items, scheduler)
+
+        offset += limit
+        if len(items) < len(api_albums['items']) or not items or \
+                offset >= api_albums['total']:
+            return
+
+
+def collect_all_albums(sp, limit=50, scheduler=None):
+    albums = list(iter_all_albums(sp, limit, scheduler))
+    with stats.phase('sort'):
+        return sorted(albums, key=lambda x: x['added'], reverse=True)
+
+
+def reconcile_albums(sp, known, known_index, api_albums, offset, total,
+                     limit=50, scheduler=None):
+    """ Rebuild a newest-first album list from the saved pages after offset
+
+    api_albums are those already fetched. The remaining pages are fetched
+    concurrently, and albums in known are reused rather than completed and
+    transformed again. Returns None if the pages don't add up to total, as
+    when the library changes while paging.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+
+    def helper(limit, offset):
+        return sp.current_user_saved_albums(limit, offset)['items']
+
+    api_albums = list(api_albums)
+    args = common.limit_split(total, offset, limit)
+    for items in scheduler.map(helper, args, ordered=True):
+        api_albums += items
+
+    if len(api_albums) != total:
+        return None
+
+    keys = [(a['album']['uri'], a['added_at']) for a in api_albums]
+    unknown = [a for a, key in zip(api_albums, keys) if key not in known_index]
+    fresh = iter(albums_to_records_collected(sp, unknown, scheduler))
+
+    return [known[known_index[key]] if key in known_index else next(fresh)
+            for key in keys]
+
+
+def sync_albums(sp, known, limit=50, scheduler=None):
+    """ Bring a newest-first album list up to date, or None if it can't be
+
+    Saved albums are returned newest first, so pages are only fetched until
+    an already known album is reached. Albums in the snapshot that are newer
+    than the first known album seen have been removed. If the rest of that
+    page or the library total show other removals, the remaining pages are
+    reconciled against the snapshot instead of collecting everything again.
+    """
+    if not known:
+        return None
+
+    scheduler = scheduler or ratelimit.Scheduler()
+    known_index = {(a['uri'], a['added']): n for n, a in enumerate(known)}
+
+    new = []
+    offset = 0
+    while True:
+        api_albums = scheduler.call(sp.current_user_saved_albums, limit,
+                                    offset)
+        total = api_albums['total']
+
+        for n, api_album in enumerate(api_albums['items']):
+            key = (api_album['album']['uri'], api_album['added_at'])
+            if key not in known_index:
+                new.append(api_album)
+                continue
+
+            start = known_index[key]
+            rest = [(a['album']['uri'], a['added_at'])
+                    for a in api_albums['items'][n:]]
+            expected = [(a['uri'], a['added'])
+                        for a in known[start:start + len(rest)]]
+            if rest != expected or \
+                    len(new) + len(known) - start != total:
+                return reconcile_albums(sp, known, known_index,
+                                        new + api_albums['items'][n:],
+                                        offset + limit, total, limit,
+                                        scheduler)
+
+            albums = albums_to_records_collected(sp, new, scheduler)
+            return albums + known[start:]
+
+        offset += limit
+        if not api_albums['items'] or offset >= total:
+            break
+
+    if len(new) != total:
+        return None
+    return albums_to_records_collected(sp, new, scheduler)
+
+
+def collect_synced_albums(sp, path, limit=50, scheduler=None):
+    """ Collect albums via the snapshot at path, updating it in place """
+    albums = sync_albums(sp, snapshot.load_snapshot(path), limit, scheduler)
+    if albums is None:
+        albums = collect_all_albums(sp, limit, scheduler)
+
+    snapshot.save_snapshot(path, albums)
+    return albums
+
+
+def iter_synced_albums(sp, path, limit=50, scheduler=None,
+                       ordered=False):
+    """ Like collect_synced_albums, yielding albums as they are fetched """
+    albums = sync_albums(sp, snapshot.load_snapshot(path), limit, scheduler)
+    if albums is not None:
+        snapshot.save_snapshot(path, albums)
+        yield from albums
+        return
+
+    albums = []
+    for album in iter_all_albums(sp, limit, scheduler, ordered):
+        albums.append(album)
+        yield album
+
+    albums.sort(key=lambda x: x['added'], reverse=True)
+    snapshot.save_snapshot(path, albums)
+
+
+def has_snapshot(snapshot_path):
+    return snapshot_path is not None and os.path.exists(snapshot_path)
+
+
+def collect_library_albums(sp, limit=50, scheduler=None, snapshot_path=None,
+                           since=None):
+    """ Collect saved albums, or only those saved since a date
+
+    An existing snapshot is always synced, which costs little more than the
+    newest page; without one, albums saved before since are never fetched.
+    """
+    if since is not None and not has_snapshot(snapshot_path):
+        return list(iter_albums_since(sp, since, limit, scheduler))
+    if snapshot_path is None:
+        return collect_all_albums(sp, limit, scheduler)
 
-    helper = collector_helper(sp)
-    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
-        album_map = executor.map(helper, args)
+    return collect_synced_albums(sp, snapshot_path, limit, scheduler)
 
-    albums = [i for s in album_map for i in s]
-    return sorted(albums, key=lambda x: x['added'], reverse=True)
 
+def iter_library_albums(sp, limit=50, scheduler=None, snapshot_path=None,
+                        ordered=False, since=None):
+    if since is not None and not has_snapshot(snapshot_path):
+        return iter_albums_since(sp, since, limit, scheduler)
+    if snapshot_path is None:
+        return iter_all_albums(sp, limit, scheduler, ordered)
 
-def collect_all_tracks(sp, limit=50, workers=50):
-    albums = collect_all_albums(sp, limit, workers)
+    return iter_synced_albums(sp, snapshot_path, limit, scheduler, ordered)
 
-    def album_tracks(album):
-        album_dict = {
-            'albumartist': album['artist'],
-            'album': album['name'],
-            'added': album['added'],
-            'art_url': album['art_url']
-        }
-        return [{**t, **album_dict} for t in album['tracks']]
 
-    tracks = [i for s in albums for i in album_tracks(s)]
+def album_tracks(album):
+    return [records.CollectedTrack(t, album) for t in album['tracks']]
 
-    return tracks
 
+def iter_tracks(albums):
+    for album in albums:
+        yield from album_tracks(album)
 
-def collect_all_artists(sp, limit=50, workers=50):
-    albums = collect_all_albums(sp, limit, workers)
-    albums_sorted = sorted(albums, key=lambda x: x['artist'])
 
-    g = itertools.groupby(albums_sorted,
-                          key=lambda x: (x['artist'], x['artist_uri']))
+def tracks_from_albums(albums):
+    return list(iter_tracks(albums))
 
-    def artist_gen(k, a):
-        return {
-            'name': k[0],
-            'uri': k[1],
-            'albums': list(a)
-        }
 
-    return [artist_gen(k, a) for k, a in g]
+def collect_all_tracks(sp, limit=50, scheduler=None, snapshot_path=None):
+    albums = collect_library_albums(sp, limit, scheduler, snapshot_path)
 
+    return tracks_from_albums(albums)
 
-def collect_all_playlists(sp, limit=50, workers=50):
-    total_playlists = sp.current_user_playlists(1)['total']
+
+def collect_all_artists(sp, limit=50, scheduler=None, snapshot_path=None):
+    albums = collect_library_albums(sp, limit, scheduler, snapshot_path)
+
+    return artists_from_albums(albums)
+
+
+def artist_key(name, uri):
+    # local files' artists have no uri, so fall back on their names
+    return uri or name
+
+
+class ArtistIndex:
+    """ Artists of saved albums, keyed by uri and updated an album at a time
+
+    Every album and track artist is credited, so featured artists get an
+    entry of their own, with the albums they appear on, how many albums and
+    tracks that is and when they were last added. Artists keep the order
+    they were first seen in.
+    """
+
+    def __init__(self, albums=()):
+        self.artists = {}
+        self.add_albums(albums)
+
+    def add_albums(self, albums):
+        for album in albums:
+            self.add_album(album)
+
+    def add_album(self, album):
+        credited = {artist_key(*a): [a, 0] for a in album['artists']}
+        for track in album['tracks']:
+            for artist in track['artists']:
+                credited.setdefault(artist_key(*artist), [artist, 0])[1] += 1
+
+        for key, ((name, uri), tracks) in credited.items():
+            entry = self.artists.get(key)
+            if entry is None:
+                entry = self.artists[key] = {
+                    'name': name,
+                    'uri': uri,
+                    'albums': [],
+                    'album_count': 0,
+                    'track_count': 0,
+                    'added': album['added'],
+                }
+
+            entry['albums'].append(album)
+            entry['album_count'] += 1
+            entry['track_count'] += tracks
+            entry['added'] = max(entry['added'], album['added'])
+
+    def values(self):
+        return list(self.artists.values())
+
+
+def artists_from_albums(albums):
+    return ArtistIndex(albums).values()
+
+
+def iter_all_playlists(sp, limit=50, scheduler=None, ordered=False):
+    scheduler = scheduler or ratelimit.Scheduler()
+    total_playlists = scheduler.call(sp.current_user_playlists, 1)['total']
 
     args = common.limit_split(total_playlists, 0, limit)
 
-    def collector_helper(sp):
-        def f(args):
-            return collect_playlists(sp, *args)
-        return f
+    def helper(limit, offset):
+        return collect_playlists(sp, limit, offset)
 
-    helper = collector_helper(sp)
-    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
-        playlist_map = executor.map(helper, args)
+    for playlists in scheduler.map(helper, args, ordered):
+        yield from playlists
 
-    playlists = [i for s in playlist_map for i in s]
-    return playlists
+
+def collect_all_playlists(sp, limit=50, scheduler=None):
+    return list(iter_all_playlists(sp, limit, scheduler, ordered=True))
+
+
+def collector(sp, resource, snapshot_path=None, scheduler=None):
+    if resource == 'albums':
+        return collect_library_albums(sp, scheduler=scheduler,
+                                      snapshot_path=snapshot_path)
+    if resource == 'tracks':
+        return collect_all_tracks(sp, scheduler=scheduler,
+                                  snapshot_path=snapshot_path)
+    if resource == 'playlists':
+        return collect_all_playlists(sp, scheduler=scheduler)
+    if resource == 'artists':
+        return collect_all_artists(sp, scheduler=scheduler,
+                                   snapshot_path=snapshot_path)
+
+    raise ValueError(f'{resource} is not a valid collector resource')
 
 
-def collector(sp, resource):
+def collect_resources(sp, resources, snapshot_path=None, scheduler=None,
+                      since=None):
+    """ Collect several resources, fetching the saved albums at most once
+
+    With since, the albums and tracks may be limited to those saved since
+    then. It is ignored along with artists, which sum up every album.
+    """
+    if 'artists' in resources:
+        since = None
+    albums = []
+
+    def library_albums():
+        if not albums:
+            albums.append(collect_library_albums(
+                sp, scheduler=scheduler, snapshot_path=snapshot_path,
+                since=since))
+        return albums[0]
+
+    collected = {}
+    for resource in resources:
+        if resource == 'albums':
+            collected[resource] = library_albums()
+        elif resource == 'tracks':
+            collected[resource] = tracks_from_albums(library_albums())
+        elif resource == 'artists':
+            collected[resource] = artists_from_albums(library_albums())
+        elif resource == 'playlists':
+            collected[resource] = collect_all_playlists(sp,
+                                                        scheduler=scheduler)
+        else:
+            raise ValueError(f'{resource} is not a valid collector resource')
+
+    return collected
+
+
+def iter_collector(sp, resource, snapshot_path=None, scheduler=None,
+                   ordered=False, since=None):
+    """ Yield collected items as each page arrives instead of all at once """
     if resource == 'albums':
-        return collect_all_albums(sp)
+        return iter_library_albums(sp, scheduler=scheduler,
+                                   snapshot_path=snapshot_path,
+                                   ordered=ordered, since=since)
     if resource == 'tracks':
-        return collect_all_tracks(sp)
+        albums = iter_library_albums(sp, scheduler=scheduler,
+                                     snapshot_path=snapshot_path,
+                                     ordered=ordered, since=since)
+        return iter_tracks(albums)
     if resource == 'playlists':
-        return collect_all_playlists(sp)
+        return iter_all_playlists(sp, scheduler=scheduler, ordered=ordered)
     if resource == 'artists':
-        return collect_all_artists(sp)
+        # albums are aggregated as they arrive, already newest first, and
+        # all of them, as each artist sums up every album
+        albums = iter_library_albums(sp, scheduler=scheduler,
+                                     snapshot_path=snapshot_path,
+                                     ordered=True)
+        return iter(artists_from_albums(albums))
 
     raise ValueError(f'{resource} is not a valid collector resource')
@@ -1,8 +1,47 @@
-from argparse import RawTextHelpFormatter
+from argparse import ArgumentTypeError, RawTextHelpFormatter
 import textwrap
 
 import configargparse
 
+from . import filters, lazy
+
+
+RESOURCES = ['artists', 'albums', 'tracks', 'playlists']
+
+
+def resource_list(value):
+    """ Parse a comma separated list of resources """
+    resources = [r.strip() for r in value.split(',') if r.strip()]
+    if not resources:
+        raise ArgumentTypeError('no resource given')
+
+    for r in resources:
+        if r not in RESOURCES:
+            choices = ', '.join(RESOURCES)
+            raise ArgumentTypeError(f'invalid resource: {r} '
+                                    f'(choose from {choices})')
+
+    return list(dict.fromkeys(resources))
+
+
+def field_list(value):
+    """ Parse a comma separated list of fields """
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    if not fields:
+        raise ArgumentTypeError('no field given')
+
+    return fields
+
+
+def condition(value):
+    """ Check a --where condition parses, keeping it as given """
+    try:
+        filters.parse_condition(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+    return value
+
 
 def parse_args(args):
     desc = 'A collection of spotify utilities for use with other shell utils.'
@@ -26,32 +65,150 @@ def parse_args(args):
                    collect: collect resources from saved collection
                    search: search spotify for resources
                    query: query a set of resource on their uris
-                   add: add resource to collection
+                   save: save resource to collection
                    delete: delete resource from collection
                    reccomend: return reccomendations based on given uris
                    follow: follow artist
-                   following: query resources based on followed artists
+                   following: list followed artists, or their albums
+                              released since the last run
                    '''
     parser.add('-a', '--action', choices=actions, default='collect',
                help=textwrap.dedent(actions_desc))
 
-    resources = ['artists', 'albums', 'tracks', 'playlists']
-    parser.add('-r', '--resource', choices=resources, default='albums',
-               help='resource to query')
+    resource_help = ('resource to query, or a comma separated list of '
+                     'resources to collect\n({})'.format(', '.join(RESOURCES)))
+    parser.add('-r', '--resource', type=resource_list, default=['albums'],
+               help=resource_help)
 
-    format_choices = ['json', 'lines', 'yaml']
+    format_choices = ['json', 'ndjson', 'lines', 'yaml']
     parser.add('-f', '--format', choices=format_choices, default='json',
                help='output format')
+    parser.add('--compact', action='store_true',
+               help='write json without indentation, using the fastest\n'
+                    'available encoder')
     parser.add('-l', '--line_format', default='{name}', type=str,
-               help='format for outputting lines, accepts json keys')
+               help='format for outputting lines, accepts json keys,\n'
+                    'dotted paths ({album.name}), defaults for missing\n'
+                    'keys ({artist|unknown}) and format specs ({name:20.20})')
+    parser.add('--fields', type=field_list, default=None,
+               help='comma separated fields to output, accepting dotted\n'
+                    'paths (uri,name,album.name)')
+    where_desc = '''\
+                 only output items meeting a condition, repeatable:
+                 a field, then >=, <=, >, <, =, != and a value or ~ and
+                 a regex (added>=2024-01-01, artist~^The)
+                 '''
+    parser.add('--where', type=condition, action='append', default=None,
+               help=textwrap.dedent(where_desc))
+
+    parser.add('-o', '--output_dir', type=str, default=None,
+               help='write each resource to its own file in this directory')
+
+    parser.add('--max_results', type=int, default=50,
+               help='maximum number of search results')
+
+    parser.add('--batch', action='store_true',
+               help='search for each line of stdin, tagging results with\n'
+                    'their query')
+
+    parser.add('--local', action='store_true',
+               help='search your saved library through a local index\n'
+                    'instead of the spotify catalog, matching words as\n'
+                    'prefixes')
+
+    parser.add('--engine', choices=['thread', 'async'], default='thread',
+               help='request engine, async needs aiohttp and always\n'
+                    'collects the whole library')
+    parser.add('--max_concurrency', type=int, default=50,
+               help='maximum number of concurrent api requests')
+    parser.add('--timeout', type=float, default=10,
+               help='seconds to wait for an api response')
+    parser.add('--rate_limit', type=float, default=None,
+               help='maximum api requests per second (default: unlimited)')
+    parser.add('--stream', action='store_true',
+               help='write items as they arrive (ndjson and lines only)')
+    parser.add('--ordered', action='store_true',
+               help='keep collection order when streaming')
+    parser.add('--refresh', action='store_true',
+               help='ignore the local library snapshot, cached searches\n'
+                    'and seen releases, fetching everything again')
+    parser.add('--no_cache', action='store_true',
+               help='neither read nor write the search and http caches')
+
+    parser.add('--stats', nargs='?', const='table', choices=['table', 'json'],
+               help='report request counts, latencies and time spent in\n'
+                    'each phase of the run on stderr (default: table)')
 
-    query_help = 'query (valid for search, add, delete, reccomend and follow)'
+    parser.add('--daemon', action='store_true',
+               help='keep a warm client and library in memory, answering\n'
+                    'other invocations for this user over a unix socket')
+    parser.add('--daemon_ttl', type=float, default=60,
+               help='seconds the daemon reuses a collected library')
+    parser.add('--no_daemon', action='store_true',
+               help='run locally even when a daemon is listening, as runs\n'
+                    'with --stats always do')
+
+    query_help = ('query (valid for search, query, save, delete, reccomend '
+                  'and follow),\nor - to read one per line from stdin')
     parser.add('query', nargs='*', help=query_help)
 
     args = parser.parse_args(args)
 
     if args.action in ['search', 'query', 'save', 'delete', 'reccomend',
-                       'follow'] and args.query == []:
+                       'follow'] and args.query == [] and not args.batch:
         parser.error('a query is needed for this action')
 
+    if len(args.resource) > 1 and args.action != 'collect':
+        parser.error('only collect accepts more than one resource')
+
+    if args.action in ['save', 'delete'] and \
+            args.resource[0] not in ['albums', 'tracks']:
+        parser.error('only albums and tracks can be saved or deleted')
+
+    if len(args.resource) > 1 and args.output_dir is None:
+        parser.error('--output_dir is needed for more than one resource')
+
+    if len(args.resource) > 1 and args.stream:
+        parser.error('--stream only supports a single resource')
+
+    if args.action == 'following' and \
+            args.resource[0] not in ['albums', 'artists']:
+        parser.error('following only lists albums and artists')
+
+    if args.batch and args.action != 'search':
+        parser.error('--batch is only valid for search')
+
+    if args.local and (args.action != 'search' or args.batch):
+        parser.error('--local is only valid for a single search')
+
+    if args.local and args.engine == 'async':
+        parser.error('--local is not supported by the async engine')
+
+    if args.batch and args.engine == 'async':
+        parser.error('--batch is not supported by the async engine')
+
+    if args.max_results < 1:
+        parser.error('--max_results must be at least 1')
+
+    if args.max_concurrency < 1:
+        parser.error('--max_concurrency must be at least 1')
+
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error('--rate_limit must be above 0')
+
+    if args.stream and args.engine == 'async':
+        parser.error('--stream is not supported by the async engine')
+
+    if args.daemon and args.engine == 'async':
+        parser.error('--daemon is not supported by the async engine')
+
+    if args.engine == 'async' and args.action not in ['collect', 'search']:
+        parser.error('the async engine only supports collect and search')
+
+    if args.engine == 'async' and not lazy.installed('aiohttp'):
+        parser.error('the async engine needs aiohttp installed')
+
+    if args.stream and args.format not in ['ndjson', 'lines']:
+        parser.error('--stream needs the ndjson or lines format')
+
     return args
@@ -1,12 +1,53 @@
+import functools
+import itertools
 import json
-import yaml
+import operator
+import re
+import string
+import sys
+
+from . import lazy, records
+
+futures = lazy.LazyModule('concurrent.futures')
+yaml = lazy.LazyModule('yaml')
+
+
+@functools.lru_cache(maxsize=None)
+def get_orjson():
+    """ Return orjson if it is installed, or None """
+    return lazy.optional_module('orjson')
+
+
+@functools.lru_cache(maxsize=None)
+def yaml_dumper():
+    # libyaml's emitter is many times faster than the pure python one
+    return getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+def join_artists(api_artists):
+    """ Join artist names, interned as the same names repeat constantly """
+    return sys.intern(', '.join(a['name'] for a in api_artists))
+
+
+def artist_credits(api_artists):
+    """ Return the shared (name, uri) pairs of the artists credited """
+    return records.shared_artists((a['name'], a.get('uri'))
+                                  for a in api_artists)
+
+
+def track_number(disc_number, track_number):
+    """ Combine disc and track numbers, so disc 1 track 2 becomes 1.02 """
+    if track_number < 100:
+        return round(disc_number + track_number / 100, 2)
+
+    return float('{}.{:02d}'.format(disc_number, track_number))
 
 
 def track_to_dict_common(api_track):
     return {
-        'artist': ', '.join(a['name'] for a in api_track['artists']),
-        'track': float('{}.{:02d}'.format(api_track['disc_number'],
-                                          api_track['track_number'])),
+        'artist': join_artists(api_track['artists']),
+        'track': track_number(api_track['disc_number'],
+                              api_track['track_number']),
         'name': api_track['name'],
         'uri': api_track['uri']
     }
@@ -14,7 +55,7 @@ def track_to_dict_common(api_track):
 
 def album_to_dict_common(api_album):
     return {
-        'artist': ', '.join(a['name'] for a in api_album['artists']),
+        'artist': join_artists(api_album['artists']),
         'name': api_album['name'],
         'uri': api_album['uri'],
         'art_url': api_album['images'][0]['url'],
@@ -35,18 +76,226 @@ def limit_split(lmax, start=0, limit=50):
     return [(limit, offset) for offset in range(start, lmax, limit)]
 
 
+def iter_pages(fetch, args, workers=50, ordered=False):
+    """ Yield fetch(*a) for each a in args as soon as each result arrives
+
+    With ordered set, results that complete early are held back until every
+    earlier page has been yielded, so the original order of args is kept.
+    At most workers pages are fetched or held back at a time, and args is
+    consumed as they're yielded, so memory doesn't grow with the pages.
+    """
+    args = iter(args)
+    with futures.ThreadPoolExecutor(workers) as executor:
+        running = {}
+        held = {}
+        submitted = 0
+        next_page = 0
+        try:
+            while True:
+                for a in itertools.islice(
+                        args, workers - len(running) - len(held)):
+                    running[executor.submit(fetch, *a)] = submitted
+                    submitted += 1
+                if not running:
+                    return
+
+                done, _ = futures.wait(running,
+                                       return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    n = running.pop(future)
+                    if ordered:
+                        held[n] = future.result()
+                    else:
+                        yield future.result()
+
+                while next_page in held:
+                    yield held.pop(next_page)
+                    next_page += 1
+        finally:
+            for future in running:
+                future.cancel()
+
+
+CONVERSIONS = {'s': str, 'r': repr, 'a': ascii}
+
+# a dotted name, or a str.format style [index]
+FIELD_KEY = re.compile(r'([^.\[\]]+)|\[([^\]]*)\]')
+
+
+def field_getter(field):
+    """ Return a function looking up a line format field in an item
+
+    Fields are dotted paths into nested items, such as album.name, with an
+    optional default after a | for when any part of the path is missing.
+    str.format's index syntax, as in album[name], works the same way.
+    """
+    path, has_default, default = field.partition('|')
+    keys = [name or index for name, index in FIELD_KEY.findall(path)]
+    keys = [int(k) if k.isdigit() else k for k in keys]
+
+    if len(keys) == 1 and not has_default:
+        return operator.itemgetter(keys[0])
+
+    def get(item):
+        try:
+            for key in keys:
+                item = item[key]
+        except (KeyError, IndexError, TypeError):
+            if has_default:
+                return default
+            raise KeyError(path)
+        return item
+
+    return get
+
+
+@functools.lru_cache(maxsize=32)
+def compile_line_format(line_format):
+    """ Parse a line format once, returning a function that renders items
+
+    Fields accept format specs for padding and truncation, so
+    {name:20.20} pads or cuts names to exactly 20 characters.
+    """
+    parts = []
+    for literal, field, spec, conversion in \
+            string.Formatter().parse(line_format):
+        if field is None:
+            parts.append((literal, None, None, None))
+            continue
+        if not field:
+            raise ValueError('line format fields need a name')
+        if '{' in spec:
+            raise ValueError('nested fields in format specs are unsupported')
+
+        convert = CONVERSIONS[conversion] if conversion else None
+        parts.append((literal, field_getter(field), spec, convert))
+
+    def render(item):
+        out = []
+        for literal, get, spec, convert in parts:
+            out.append(literal)
+            if get is None:
+                continue
+            value = get(item)
+            if convert is not None:
+                value = convert(value)
+            out.append(format(value, spec))
+        return ''.join(out)
+
+    return render
+
+
 def format_dict(d, format_string):
-    return format_string.format(**d)
+    return compile_line_format(format_string)(d)
 
 
 def format_lines(items, line_format):
-    return '\n'.join(format_dict(line, line_format) for line in items)
+    render = compile_line_format(line_format)
+    return '\n'.join(render(item) for item in items)
+
+
+def dump_json(obj, compact=False):
+    """ Encode obj as json, compact output taking the fastest encoder
+
+    Indented output always goes through the standard library, as that is
+    the only encoder producing the familiar four space indent; its C
+    accelerated encoder is only used when not indenting.
+    """
+    if not compact:
+        return json.dumps(obj, indent=4, default=records.to_builtin)
+    orjson = get_orjson()
+    if orjson is not None:
+        return orjson.dumps(obj, default=records.to_builtin).decode()
+
+    return json.dumps(obj, separators=(',', ':'),
+                      default=records.to_builtin)
+
+
+def dump_yaml(obj):
+    return yaml.dump(records.builtin_value(obj), Dumper=yaml_dumper())
+
+
+def format_item(item, output_format, line_format):
+    if output_format == 'ndjson':
+        return dump_json(item, compact=True)
+    if output_format == 'lines':
+        return format_dict(item, line_format)
+
+    raise ValueError(f'{output_format} is not a streamable format')
+
+
+def write_items(items, output_format, line_format, out):
+    """ Write each item to out as a line as soon as it is produced
+
+    Once the reader is gone, as when piped to head, the items are closed so
+    no more are fetched for it.
+    """
+    try:
+        for item in items:
+            out.write(format_item(item, output_format, line_format) + '\n')
+            out.flush()
+    except BrokenPipeError:
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+        raise
+
+
+def write_formatted(items, output_format, line_format, out, compact=False):
+    """ Write the same output as formatter, one item at a time
+
+    This never holds the whole formatted output in memory, and starts
+    writing as soon as the first item is formatted.
+    """
+    if output_format == 'lines':
+        render = compile_line_format(line_format)
+        write = out.write
+        for item in items:
+            write(render(item))
+            write('\n')
+        return
+
+    if output_format == 'ndjson':
+        for item in items:
+            out.write(dump_json(item, compact=True) + '\n')
+        return
+
+    if output_format == 'yaml':
+        empty = True
+        for item in items:
+            out.write(dump_yaml([item]))
+            empty = False
+        if empty:
+            out.write(dump_yaml([]))
+        return
+
+    if output_format != 'json':
+        raise ValueError(f'{output_format} is not a valid output format')
+
+    start, sep, end = ('[', ',', ']') if compact else ('[\n', ',\n', '\n]')
+    empty = True
+    for item in items:
+        encoded = dump_json(item, compact)
+        if not compact:
+            encoded = '    ' + encoded.replace('\n', '\n    ')
+        out.write((start if empty else sep) + encoded)
+        empty = False
+
+    out.write('[]\n' if empty else end + '\n')
+
+
+def output_filename(resource, output_format):
+    extension = 'txt' if output_format == 'lines' else output_format
+
+    return f'{resource}.{extension}'
 
 
-def formatter(items, output_format, line_format):
+def formatter(items, output_format, line_format, compact=False):
     if output_format == 'json':
-        return json.dumps(items, indent=4)
+        return dump_json(items, compact)
+    if output_format == 'ndjson':
+        return '\n'.join(dump_json(i, compact=True) for i in items)
     if output_format == 'lines':
         return format_lines(items, line_format)
     if output_format == 'yaml':
-        return yaml.dump(items)
+        return dump_yaml(items)
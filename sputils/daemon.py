@@ -0,0 +1,201 @@
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+# characters of output buffered into each frame sent to the client
+FRAME_SIZE = 64 * 1024
+
+
+def socket_path(user):
+    """ Return the path of the daemon socket for a user """
+    return os.path.expanduser(f'~/.cache/sputils/{user}.sock')
+
+
+def needs_stdin(args):
+    """ Whether an invocation reads its input from stdin """
+    return args.batch or args.query == ['-']
+
+
+class LibraryCache:
+    """ Collected resources kept in memory between forwarded invocations
+
+    Resources are reused for ttl seconds, after which the next collect
+    fetches them again through the snapshot sync. Collects are serialized so
+    that concurrent invocations share a single fetch.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, resources, refresh, fetch):
+        """ Return a dict of resource to items, fetching stale resources """
+        with self.lock:
+            now = time.monotonic()
+            stale = [r for r in resources if refresh or r not in self.items
+                     or self.items[r][0] + self.ttl < now]
+            if stale:
+                for resource, items in fetch(stale).items():
+                    self.items[resource] = (now, list(items))
+
+            return {r: self.items[r][1] for r in resources}
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class FrameWriter:
+    """ File-like object sending its writes to the client as json frames
+
+    Writes are buffered into frames of about frame_size characters, sent
+    once full or flushed, so a line per write doesn't cost a frame each.
+    """
+
+    def __init__(self, wfile, frame_size=FRAME_SIZE):
+        self.wfile = wfile
+        self.frame_size = frame_size
+        self.chunks = []
+        self.buffered = 0
+
+    def write_frame(self, frame):
+        self.wfile.write(json.dumps(frame).encode('utf-8') + b'\n')
+
+    def send(self, frame):
+        """ Send a frame after whatever output is still buffered """
+        self.flush()
+        self.write_frame(frame)
+
+    def write(self, data):
+        if data:
+            self.chunks.append(data)
+            self.buffered += len(data)
+            if self.buffered >= self.frame_size:
+                self.flush()
+
+    def flush(self):
+        if self.chunks:
+            data = ''.join(self.chunks)
+            self.chunks = []
+            self.buffered = 0
+            self.write_frame({'data': data})
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # is_listening probes connect without sending a request
+            return
+
+        request = json.loads(line)
+        args = argparse.Namespace(**request['args'])
+        stdin = io.StringIO(''.join(request['stdin']))
+        out = FrameWriter(self.wfile)
+
+        try:
+            self.server.run_request(args, stdin, out)
+            out.send({'exit': 0})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            out.send({'error': f'{type(e).__name__}: {e}'})
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, run_request):
+        self.run_request = run_request
+
+        # the socket acts with the user's spotify credentials
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+
+def is_listening(path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    return True
+
+
+def make_server(path, run_request):
+    """ Bind the daemon socket, replacing one left behind by a dead daemon """
+    if is_listening(path):
+        raise RuntimeError(f'a daemon is already listening on {path}')
+    if os.path.exists(path):
+        os.remove(path)
+
+    return DaemonServer(path, run_request)
+
+
+def serve(path, run_request):
+    """ Answer forwarded invocations with run_request until interrupted
+
+    run_request is called from a thread per invocation with its parsed
+    arguments, a file with its stdin and a file to write its output to.
+    """
+    server = make_server(path, run_request)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def forward(path, args, stdin, stdout):
+    """ Run an invocation on the daemon, writing its output to stdout
+
+    Returns the exit status, or None if no daemon is listening so the caller
+    can run the invocation itself.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+
+    request_args = dict(vars(args))
+    if request_args.get('output_dir') is not None:
+        # the daemon doesn't share our working directory
+        request_args['output_dir'] = os.path.abspath(args.output_dir)
+
+    request = {
+        'args': request_args,
+        'stdin': list(stdin) if needs_stdin(args) else [],
+    }
+
+    with sock, sock.makefile('rwb') as f:
+        f.write(json.dumps(request).encode('utf-8') + b'\n')
+        f.flush()
+
+        for line in f:
+            frame = json.loads(line)
+            if 'data' in frame:
+                stdout.write(frame['data'])
+                stdout.flush()
+            elif 'error' in frame:
+                print(f'sputils daemon: {frame["error"]}', file=sys.stderr)
+                return 1
+            else:
+                return frame['exit']
+
+    print('sputils daemon: connection closed', file=sys.stderr)
+    return 1
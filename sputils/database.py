@@ -0,0 +1,28 @@
+import sqlite3
+import threading
+
+
+class Database:
+    """ Sqlite database opened once in each thread that uses it
+
+    Sqlite connections can't be shared between threads, so each gets its
+    own. In WAL mode readers carry on while another thread, or another
+    sputils process, writes, and writers wait up to 30 seconds for a lock.
+    """
+
+    # extra pragmas set on every connection, such as 'synchronous=NORMAL'
+    pragmas = ()
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            for pragma in self.pragmas:
+                conn.execute(f'PRAGMA {pragma}')
+            self.local.conn = conn
+        return conn
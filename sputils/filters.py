@@ -0,0 +1,115 @@
+import operator
+import re
+
+from . import common
+
+CONDITION = re.compile(r'^\s*([\w.]+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$')
+
+COMPARISONS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '=': operator.eq,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+
+
+def split_condition(condition):
+    """ Split a condition such as added>=2024-01-01 into its three parts """
+    match = CONDITION.match(condition)
+    if match is None:
+        raise ValueError(f'invalid condition: {condition}')
+
+    return match.groups()
+
+
+def parse_condition(condition):
+    """ Return a predicate testing items against a condition
+
+    Fields are dotted paths as in line formats. Numbers compare numerically
+    and everything else as strings, which orders iso dates correctly; ~
+    searches the field with a regular expression. Items missing the field
+    never match.
+    """
+    field, op, value = split_condition(condition)
+    get = common.field_getter(field)
+
+    if op == '~':
+        try:
+            pattern = re.compile(value)
+        except re.error as e:
+            raise ValueError(f'invalid regex in {condition}: {e}') from None
+
+        def test(found):
+            return pattern.search(str(found)) is not None
+    else:
+        compare = COMPARISONS[op]
+        try:
+            number = float(value)
+        except ValueError:
+            number = None
+
+        def test(found):
+            if isinstance(found, (int, float)) and not isinstance(found, bool):
+                return number is not None and compare(found, number)
+            return compare(str(found), value)
+
+    def predicate(item):
+        try:
+            found = get(item)
+        except KeyError:
+            return False
+        return found is not None and test(found)
+
+    return predicate
+
+
+def parse_where(conditions):
+    """ Return a predicate matching items meeting all conditions, or None """
+    if not conditions:
+        return None
+
+    predicates = [parse_condition(c) for c in conditions]
+    if len(predicates) == 1:
+        return predicates[0]
+
+    return lambda item: all(p(item) for p in predicates)
+
+
+def lower_bound(conditions, field):
+    """ Return the highest value conditions require field to reach, if any
+
+    Used to stop fetching newest-first pages once they are too old.
+    """
+    bounds = [value for f, op, value in map(split_condition, conditions or [])
+              if f == field and op in ('>=', '>', '=')]
+
+    return max(bounds, default=None)
+
+
+def projector(fields):
+    """ Return a function building a dict of only the given fields """
+    getters = [(f, common.field_getter(f)) for f in fields]
+
+    def project(item):
+        projected = {}
+        for field, get in getters:
+            try:
+                projected[field] = get(item)
+            except KeyError:
+                projected[field] = None
+        return projected
+
+    return project
+
+
+def filter_items(items, conditions=None, fields=None):
+    """ Yield the items meeting conditions, projected onto fields """
+    predicate = parse_where(conditions)
+    project = projector(fields) if fields else None
+
+    for item in items:
+        if predicate is not None and not predicate(item):
+            continue
+        yield project(item) if project is not None else item
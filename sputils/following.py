@@ -0,0 +1,149 @@
+import os
+
+from . import common, ratelimit, search, statefile
+
+STATE_VERSION = 1
+
+# an artist's own releases, leaving out appearances and compilations
+RELEASE_TYPES = 'album,single'
+
+
+def state_path(user):
+    """ Return the path of the followed artists' last seen releases """
+    return os.path.expanduser(f'~/.cache/sputils/{user}_following.json')
+
+
+def load_state(path):
+    """ Load each artist's last seen releases, or an empty dict if unusable """
+    state = statefile.load(path, STATE_VERSION)
+    if state is None:
+        return {}
+
+    return state.get('artists', {})
+
+
+def save_state(path, artists):
+    """ Atomically write each artist's last seen releases """
+    statefile.save(path, STATE_VERSION, {'artists': artists})
+
+
+def release_to_dict(api_album):
+    common_dict = common.album_to_dict_common(api_album)
+
+    release = {
+        'release_date': api_album['release_date'],
+        'album_type': api_album['album_type'],
+    }
+
+    return {**common_dict, **release}
+
+
+def iter_followed_artists(sp, limit=50, scheduler=None):
+    """ Yield followed artists, following the cursor from page to page
+
+    Each page's cursor comes with the page, so unlike offset pages they
+    can only be fetched one after another.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+    after = None
+    while True:
+        page = scheduler.call(sp.current_user_followed_artists, limit,
+                              after)['artists']
+        yield from page['items']
+
+        after = (page.get('cursors') or {}).get('after')
+        if page['next'] is None or after is None:
+            return
+
+
+def collect_followed_artists(sp, limit=50, scheduler=None):
+    return [search.artist_to_dict_searched(a)
+            for a in iter_followed_artists(sp, limit, scheduler)]
+
+
+def collect_artist_albums(sp, artist_id, limit, offset):
+    return sp.artist_albums(artist_id, RELEASE_TYPES, None, limit, offset)
+
+
+def unchanged(page, known):
+    """ Whether an artist's first page shows nothing new since last run """
+    if known is None or known['total'] != page['total']:
+        return False
+
+    seen = set(known['seen'])
+    return all(a['uri'] in seen for a in page['items'])
+
+
+def new_releases(sp, artist_ids, known, limit=50, scheduler=None):
+    """ Return releases not seen before by artist, and the updated state
+
+    The first page of every artist's releases is fetched concurrently.
+    Artists whose release count and first page match the last run are
+    skipped; only the others have their remaining pages fetched.
+
+    artist_ids may be lazy, such as the followed artists' cursor pages,
+    which are then fetched while the first pages already are.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+    ids = []
+
+    def helper(artist_id, limit, offset):
+        return collect_artist_albums(sp, artist_id, limit, offset)
+
+    def first_page_args():
+        for i in artist_ids:
+            ids.append(i)
+            yield i, limit, 0
+
+    first_pages = list(scheduler.map(helper, first_page_args(),
+                                     ordered=True))
+    pages = dict(zip(ids, first_pages))
+
+    changed = {i: list(page['items']) for i, page in pages.items()
+               if not unchanged(page, known.get(i))}
+    args = [(i, lim, offset) for i in changed
+            for lim, offset in common.limit_split(pages[i]['total'], limit,
+                                                  limit)]
+    for (i, _, _), page in zip(args, scheduler.map(helper, args,
+                                                   ordered=True)):
+        changed[i] += page['items']
+
+    state = {i: known[i] for i in ids if i not in changed}
+    releases = {}
+    for i, albums in changed.items():
+        seen = set(known[i]['seen']) if i in known else set()
+        for album in albums:
+            if album['uri'] not in seen:
+                releases.setdefault(album['uri'], album)
+
+        state[i] = {'total': pages[i]['total'],
+                    'seen': [a['uri'] for a in albums]}
+
+    return list(releases.values()), state
+
+
+def collect_new_releases(sp, path, limit=50, scheduler=None, refresh=False):
+    """ Collect releases of followed artists since the last run, newest first
+
+    The first run, or one with refresh, returns every release. Artists no
+    longer followed are forgotten.
+    """
+    known = {} if refresh else load_state(path)
+    artist_ids = (a['id'] for a in iter_followed_artists(sp, limit,
+                                                         scheduler))
+
+    releases, state = new_releases(sp, artist_ids, known, limit, scheduler)
+    save_state(path, state)
+
+    releases = [release_to_dict(a) for a in releases]
+    return sorted(releases, key=lambda x: x['release_date'], reverse=True)
+
+
+def follower(sp, resource, path, scheduler=None, refresh=False):
+    if resource == 'albums':
+        return collect_new_releases(sp, path, scheduler=scheduler,
+                                    refresh=refresh)
+    if resource == 'artists':
+        return collect_followed_artists(sp, scheduler=scheduler)
+
+    raise ValueError(f'{resource} is not a valid following resource')
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+
+import requests
+
+from . import adapters, database
+
+
+def cache_path(user):
+    """ Return the path of a user's http response cache """
+    return os.path.expanduser(f'~/.cache/sputils/{user}_http.sqlite')
+
+
+class HttpCache(database.Database):
+    """ Size bounded sqlite store of response bodies and their etags
+
+    Once the bodies add up to more than max_bytes the least recently used
+    are evicted, checked whenever another tenth of that has been written.
+    Access times are only kept to the minute, sparing most hits a write.
+    A lost write only costs a refetch, so commits aren't synced to disk.
+    """
+    pragmas = ('synchronous=NORMAL',)
+
+    def __init__(self, path, max_bytes=128 * 2 ** 20):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.lock = threading.Lock()
+
+        with self.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS http_cache (
+                                url TEXT PRIMARY KEY,
+                                etag TEXT NOT NULL,
+                                content_type TEXT,
+                                body BLOB NOT NULL,
+                                size INTEGER NOT NULL,
+                                accessed REAL NOT NULL)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS http_cache_accessed
+                            ON http_cache (accessed)''')
+
+    def get(self, url):
+        """ Return the cached (etag, content type, body) of a url, or None """
+        now = time.time()
+        with self.connection() as conn:
+            row = conn.execute('SELECT etag, content_type, body, accessed '
+                               'FROM http_cache WHERE url = ?',
+                               (url,)).fetchone()
+            if row is None:
+                return None
+
+            if row[3] < now - 60:
+                conn.execute('UPDATE http_cache SET accessed = ? '
+                             'WHERE url = ?', (now, url))
+        return row[:3]
+
+    def set(self, url, etag, content_type, body):
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO http_cache '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         (url, etag, content_type, body, len(body),
+                          time.time()))
+
+        with self.lock:
+            self.written += len(body)
+            evict = self.written > self.max_bytes // 10
+            if evict:
+                self.written = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """ Drop the least recently used bodies beyond max_bytes """
+        with self.connection() as conn:
+            conn.execute('''DELETE FROM http_cache WHERE url IN (
+                                SELECT url FROM (
+                                    SELECT url, SUM(size) OVER (
+                                        ORDER BY accessed DESC) AS total
+                                    FROM http_cache)
+                                WHERE total > ?)''', (self.max_bytes,))
+
+
+class CachingAdapter(adapters.KeepAliveAdapter):
+    """ Transport adapter revalidating GETs against an HttpCache
+
+    Cached GETs are sent with If-None-Match, and a 304 is answered with the
+    cached body as a 200, so clients never see the difference. Those
+    responses are marked revalidated for the --stats report.
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        cached = self.cache.get(request.url)
+        if cached is not None:
+            request.headers['If-None-Match'] = cached[0]
+
+        response = super().send(request, **kwargs)
+        response.revalidated = False
+
+        if response.status_code == 304 and cached is not None:
+            _, content_type, body = cached
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = bytes(body)
+            response.headers['Content-Length'] = str(len(body))
+            if content_type:
+                response.headers['Content-Type'] = content_type
+            # without it requests would guess the encoding, slowly
+            response.encoding = requests.utils.get_encoding_from_headers(
+                response.headers)
+            response.revalidated = True
+        elif response.status_code == 200 and response.headers.get('ETag'):
+            self.cache.set(request.url, response.headers['ETag'],
+                           response.headers.get('Content-Type'),
+                           response.content)
+
+        return response
@@ -0,0 +1,50 @@
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """ Stand-in for a module that is only imported when first used
+
+    Keeps slow imports such as spotipy and yaml off the startup path of
+    invocations that never touch them, like --help or argument errors.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._load()
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            if attr.startswith('__'):
+                raise
+
+        # submodules such as spotipy.util aren't imported by the package
+        try:
+            return importlib.import_module(f'{self._name}.{attr}')
+        except ModuleNotFoundError:
+            raise AttributeError(f'module {self._name!r} has no attribute '
+                                 f'{attr!r}') from None
+
+    def __repr__(self):
+        return f'<lazy module {self._name!r}>'
+
+
+def optional_module(name):
+    """ Import and return a module, or None if it isn't installed """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def installed(name):
+    """ Whether a module is installed, without importing it """
+    return importlib.util.find_spec(name) is not None
@@ -0,0 +1,74 @@
+import functools
+
+from . import query, ratelimit
+
+# maximum ids accepted by the saved albums and tracks endpoints
+BATCH_SIZES = {
+    'albums': 20,
+    'tracks': 50,
+}
+
+
+def saved_albums_contains(sp, ids):
+    """ Check which album ids are saved, which spotipy 2.4.4 can't """
+    return sp._get('me/albums/contains?ids=' + ','.join(ids))
+
+
+def saved_albums_delete(sp, ids):
+    """ Remove album ids from the library, which spotipy 2.4.4 can't """
+    return sp._delete('me/albums?ids=' + ','.join(ids))
+
+
+def library_methods(sp, resource):
+    """ Return the contains, add and delete methods for a saved resource """
+    if resource == 'albums':
+        return (functools.partial(saved_albums_contains, sp),
+                sp.current_user_saved_albums_add,
+                functools.partial(saved_albums_delete, sp))
+    if resource == 'tracks':
+        return (sp.current_user_saved_tracks_contains,
+                sp.current_user_saved_tracks_add,
+                sp.current_user_saved_tracks_delete)
+
+    raise ValueError(f'{resource} is not a valid library resource')
+
+
+def saved_ids(contains, ids, size, scheduler):
+    """ Return the set of ids already in the library """
+    batches = query.chunks(ids, size)
+    results = scheduler.map(contains, [(b,) for b in batches], ordered=True)
+
+    return {i for batch, saved in zip(batches, results)
+            for i, s in zip(batch, saved) if s}
+
+
+def change_library(sp, uris, resource, save, scheduler=None):
+    """ Save or delete resources, only sending those that would change
+
+    Library membership is checked first with the bulk contains endpoint,
+    then the remaining ids are sent in concurrent batches.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+    contains, add, delete = library_methods(sp, resource)
+    size = BATCH_SIZES[resource]
+
+    ids = list(dict.fromkeys(query.uri_to_id(u) for u in uris))
+    saved = saved_ids(contains, ids, size, scheduler)
+
+    changes = [i for i in ids if (i in saved) != save]
+    batches = query.chunks(changes, size)
+    for _ in scheduler.map(add if save else delete, [(b,) for b in batches]):
+        pass
+
+    changed = set(changes)
+    uri_type = resource[:-1]
+    return [{'uri': f'spotify:{uri_type}:{i}', 'changed': i in changed}
+            for i in ids]
+
+
+def saver(sp, uris, resource, scheduler=None):
+    return change_library(sp, uris, resource, True, scheduler)
+
+
+def deleter(sp, uris, resource, scheduler=None):
+    return change_library(sp, uris, resource, False, scheduler)
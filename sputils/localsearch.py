@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import time
+
+from . import collect, database, snapshot
+
+LOCAL_RESOURCES = ['albums', 'tracks', 'artists', 'playlists']
+
+
+def index_path(user):
+    """ Return the path of the local library index for a user """
+    return os.path.expanduser(f'~/.cache/sputils/{user}_index.sqlite')
+
+
+def album_to_dict_indexed(album):
+    return {
+        'artist': album['artist'],
+        'name': album['name'],
+        'uri': album['uri'],
+        'art_url': album['art_url'],
+        'artist_uri': album['artist_uri']
+    }
+
+
+def track_to_dict_indexed(track, album):
+    return {
+        'artist': track['artist'],
+        'track': track['track'],
+        'name': track['name'],
+        'uri': track['uri'],
+        'album': {
+            'name': album['name'],
+            'uri': album['uri'],
+            # saved albums are collected without their release dates
+            'release_date': None,
+            'art_url': album['art_url']
+        }
+    }
+
+
+def album_rows(albums):
+    """ Return the index rows for albums, and their tracks and artists
+
+    Rows are (uri, item, name, artist, album) with item the dict search
+    results are given as, and the rest the text that is matched.
+    """
+    rows = {'albums': [], 'tracks': [], 'artists': []}
+    for album in albums:
+        rows['albums'].append((album['uri'], album_to_dict_indexed(album),
+                               album['name'], album['artist'], ''))
+        rows['tracks'] += [(t['uri'], track_to_dict_indexed(t, album),
+                            t['name'], t['artist'], album['name'])
+                           for t in album['tracks']]
+
+    for artist in collect.artists_from_albums(albums):
+        item = {'name': artist['name'], 'uri': artist['uri']}
+        key = collect.artist_key(artist['name'], artist['uri'])
+        rows['artists'].append((key, item, artist['name'], '', ''))
+
+    return rows
+
+
+def playlist_rows(playlists):
+    return [(p['uri'], p, p['name'], '', '') for p in playlists]
+
+
+def match_query(qry):
+    """ Turn a query into an fts match of every word as a prefix """
+    words = re.findall(r'\w+', qry.lower())
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+class LibraryIndex(database.Database):
+    """ Sqlite full text index over a user's collected library
+
+    Words match case and accent insensitively, each as a prefix, and results
+    are ranked by relevance. Updates only touch the rows that changed.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+
+        with self.connection() as conn:
+            conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS library
+                            USING fts5(
+                                resource UNINDEXED,
+                                uri UNINDEXED,
+                                item UNINDEXED,
+                                name, artist, album,
+                                tokenize = 'unicode61 remove_diacritics 2',
+                                prefix = '1 2 3')''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS library_state (
+                                key TEXT PRIMARY KEY,
+                                value REAL NOT NULL)''')
+
+    def state(self, key):
+        row = self.connection().execute(
+            'SELECT value FROM library_state WHERE key = ?',
+            (key,)).fetchone()
+        return row and row[0]
+
+    def set_state(self, key, value):
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO library_state VALUES (?, ?)',
+                         (key, value))
+
+    def update(self, resource, rows):
+        """ Make a resource's rows match rows, returning how many changed """
+        with self.connection() as conn:
+            indexed = {uri: (rowid, item) for rowid, uri, item in conn.execute(
+                'SELECT rowid, uri, item FROM library WHERE resource = ?',
+                (resource,))}
+
+            stale = []
+            inserts = {}
+            for uri, item, name, artist, album in rows:
+                item = json.dumps(item, sort_keys=True)
+                if uri in inserts:
+                    continue
+
+                old = indexed.pop(uri, None)
+                if old is not None and old[1] == item:
+                    continue
+                if old is not None:
+                    stale.append(old[0])
+                inserts[uri] = (resource, uri, item, name, artist, album)
+
+            # whatever is left over is no longer in the library
+            stale += [rowid for rowid, _ in indexed.values()]
+
+            conn.executemany('DELETE FROM library WHERE rowid = ?',
+                             [(rowid,) for rowid in stale])
+            conn.executemany('INSERT INTO library VALUES (?, ?, ?, ?, ?, ?)',
+                             inserts.values())
+
+        return len(inserts) + len(indexed)
+
+    def search(self, qry, resource, max_results=50):
+        match = match_query(qry)
+        if not match:
+            return []
+
+        cursor = self.connection().execute(
+            'SELECT item FROM library WHERE library MATCH ? '
+            'AND resource = ? ORDER BY rank LIMIT ?',
+            (match, resource, max_results))
+        return [json.loads(item) for item, in cursor]
+
+
+def sync_index(index, sp, user, resource, scheduler=None, refresh=False):
+    """ Bring the index up to date with the library before a search
+
+    Albums, tracks and artists come from the album snapshot, re-indexed
+    whenever a collect has changed it since, and only synced with the api
+    when there is no snapshot yet or on refresh. Playlists are fetched the
+    first time they're searched, and kept up to date by collects.
+    """
+    if resource == 'playlists':
+        if refresh or index.state('playlists') is None:
+            playlists = collect.collect_all_playlists(sp, scheduler=scheduler)
+            update_playlists(index, playlists)
+        return
+
+    path = snapshot.snapshot_path(user)
+    if refresh or not os.path.exists(path):
+        collect.collect_synced_albums(sp, path, scheduler=scheduler)
+
+    mtime = os.path.getmtime(path)
+    if index.state('albums') != mtime:
+        update_albums(index, snapshot.load_snapshot(path))
+        index.set_state('albums', mtime)
+
+
+def update_albums(index, albums):
+    for resource, rows in album_rows(albums).items():
+        index.update(resource, rows)
+
+
+def update_playlists(index, playlists):
+    index.update('playlists', playlist_rows(playlists))
+    index.set_state('playlists', time.time())
+
+
+def update_collected_playlists(path, playlists):
+    """ Update the playlists of an existing index after a collect """
+    if os.path.exists(path):
+        update_playlists(LibraryIndex(path), playlists)
+
+
+def local_searcher(index, qry, resource, max_results=50):
+    if resource not in LOCAL_RESOURCES:
+        raise ValueError(f'{resource} is not a valid search resource')
+
+    return index.search(qry, resource, max_results)
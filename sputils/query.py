@@ -0,0 +1,70 @@
+from . import common, ratelimit, search
+
+# maximum ids accepted by each of the several ids endpoints
+BATCH_SIZES = {
+    'tracks': 50,
+    'artists': 50,
+    'albums': 20,
+}
+
+
+def uri_to_id(uri):
+    """ Return the id from a spotify uri, url or bare id """
+    return uri.split('?')[0].rstrip('/').split('/')[-1].split(':')[-1]
+
+
+def chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def query_tracks(sp, ids):
+    return [t and search.track_to_dict_searched(t)
+            for t in sp.tracks(ids)['tracks']]
+
+
+def query_albums(sp, ids):
+    return [a and search.album_to_dict_searched(a)
+            for a in sp.albums(ids)['albums']]
+
+
+def query_artists(sp, ids):
+    return [a and search.artist_to_dict_searched(a)
+            for a in sp.artists(ids)['artists']]
+
+
+def query_playlist(sp, user, playlist_id):
+    return common.playlist_to_dict(sp.user_playlist(user, playlist_id))
+
+
+def query_batches(fetch, ids, size, scheduler):
+    """ Look up ids in concurrent batches, returning a dict of id to item """
+    batches = chunks(ids, size)
+    results = scheduler.map(fetch, [(b,) for b in batches], ordered=True)
+
+    return {i: item for batch, items in zip(batches, results)
+            for i, item in zip(batch, items)}
+
+
+def querier(sp, uris, resource, user=None, scheduler=None):
+    """ Look up resources by uri, in input order with duplicates dropped """
+    scheduler = scheduler or ratelimit.Scheduler()
+    ids = list(dict.fromkeys(uri_to_id(u) for u in uris))
+
+    if resource == 'tracks':
+        found = query_batches(lambda b: query_tracks(sp, b), ids,
+                              BATCH_SIZES[resource], scheduler)
+    elif resource == 'albums':
+        found = query_batches(lambda b: query_albums(sp, b), ids,
+                              BATCH_SIZES[resource], scheduler)
+    elif resource == 'artists':
+        found = query_batches(lambda b: query_artists(sp, b), ids,
+                              BATCH_SIZES[resource], scheduler)
+    elif resource == 'playlists':
+        # there is no several playlists endpoint, so fetch them one by one
+        def helper(batch):
+            return [query_playlist(sp, user, batch[0])]
+        found = query_batches(helper, ids, 1, scheduler)
+    else:
+        raise ValueError(f'{resource} is not a valid query resource')
+
+    return [found[i] for i in ids if found.get(i)]
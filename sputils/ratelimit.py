@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+from . import common, stats
+
+
+def retry_after(exc):
+    """ Return the delay requested by a rate limited call, or None """
+    if getattr(exc, 'http_status', None) != 429:
+        return None
+
+    headers = getattr(exc, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def is_retryable(exc):
+    """ Return whether a failed call is worth trying again """
+    status = getattr(exc, 'http_status', None)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+
+    # requests' connection errors and timeouts are OSErrors
+    return isinstance(exc, OSError)
+
+
+class TokenBucket:
+    """ Spread calls out to a steady rate, pausing entirely when asked to
+
+    A rate of None allows unlimited calls, so the bucket only enforces
+    pauses such as those requested by a Retry-After header.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def reserve(self):
+        """ Take a token if possible, returning how long to wait if not """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.resume_at:
+                return self.resume_at - now
+            if self.rate is None:
+                return 0
+
+            elapsed = now - self.updated
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.reserve()
+
+
+class AIMDLimiter:
+    """ Bound in-flight calls, adjusting the bound to observed behaviour
+
+    The limit grows additively while calls succeed at a healthy latency and
+    is cut multiplicatively when a call is throttled or takes much longer
+    than the running average.
+    """
+
+    def __init__(self, max_limit, initial=None, decrease=0.5,
+                 latency_factor=3.0):
+        self.max_limit = max_limit
+        self.limit = float(initial or max(1, max_limit // 4))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.avg_latency = None
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, throttled=False):
+        with self.cond:
+            self.in_flight -= 1
+
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            slow = latency > self.avg_latency * self.latency_factor
+            self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+
+            if throttled or slow:
+                self.limit = max(1.0, self.limit * self.decrease)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self.cond.notify_all()
+
+
+class Scheduler:
+    """ Run api calls concurrently without tripping the api's rate limits """
+
+    def __init__(self, max_concurrency=50, rate=None, retries=5,
+                 backoff=0.5):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate)
+        self.limiter = AIMDLimiter(max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+
+    def call(self, func, *args):
+        """ Call func(*args), retrying with jittered backoff on failure """
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = func(*args)
+            except Exception as e:
+                delay = retry_after(e)
+                self.limiter.release(time.monotonic() - start,
+                                     throttled=delay is not None)
+
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                stats.emit('retry', error=e, attempt=attempt)
+                if delay is not None:
+                    self.bucket.pause(delay)
+
+                backoff = self.backoff * 2 ** attempt
+                time.sleep(random.uniform(0, backoff))
+                continue
+
+            self.limiter.release(time.monotonic() - start)
+            return result
+
+    def map(self, func, args, ordered=False):
+        """ Yield func(*a) for each a in args as each call completes """
+        def helper(*a):
+            return self.call(func, *a)
+
+        return common.iter_pages(helper, args, self.max_concurrency, ordered)
@@ -0,0 +1,134 @@
+import sys
+from collections.abc import Mapping
+
+# every distinct artist credit, so records crediting the same share one
+SHARED_ARTISTS = {}
+
+
+def shared_artists(artists):
+    """ Return (name, uri) pairs as a tuple shared by equal credits
+
+    Most tracks credit the same artists as the rest of their album, so
+    records hold a reference to one tuple rather than lists of their own.
+    """
+    key = tuple((sys.intern(name), uri) for name, uri in artists)
+    return SHARED_ARTISTS.setdefault(key, key)
+
+
+def to_builtin(obj):
+    """ Convert records to plain dicts, for use as a json default hook """
+    if isinstance(obj, Record):
+        return obj.to_dict()
+
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def to_stored(obj):
+    """ Like to_builtin, but keeping hidden fields, for snapshots """
+    if isinstance(obj, Record):
+        return obj.to_dict(hidden=True)
+
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def builtin_value(value, hidden=False):
+    if isinstance(value, Record):
+        return value.to_dict(hidden)
+    if isinstance(value, list):
+        return [builtin_value(v, hidden) for v in value]
+    if isinstance(value, dict):
+        return {k: builtin_value(v, hidden) for k, v in value.items()}
+    return value
+
+
+class Record(Mapping):
+    """ Read-only mapping over a fixed set of slotted fields
+
+    Records behave like the dicts sputils used to build, so formatting and
+    sorting code can index them by key, but only become dicts when
+    serialized. Hidden fields can be indexed too, but are left out of the
+    output and only kept in snapshots.
+    """
+    __slots__ = ()
+    fields = ()
+    hidden = ()
+
+    def __getitem__(self, key):
+        if key not in self.fields and key not in self.hidden:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self, hidden=False):
+        fields = self.fields + self.hidden if hidden else self.fields
+        return {f: builtin_value(getattr(self, f), hidden) for f in fields}
+
+
+class Track(Record):
+    fields = ('artist', 'track', 'name', 'uri')
+    hidden = ('artists',)
+    __slots__ = fields + hidden
+
+    def __init__(self, artist, track, name, uri, artists=()):
+        self.artist = artist
+        self.track = track
+        self.name = name
+        self.uri = uri
+        self.artists = artists
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['artist'], d['track'], d['name'], d['uri'],
+                   shared_artists(d.get('artists', ())))
+
+
+class CollectedAlbum(Record):
+    fields = ('artist', 'name', 'uri', 'art_url', 'artist_uri', 'added',
+              'tracks')
+    hidden = ('artists',)
+    __slots__ = fields + hidden
+
+    def __init__(self, artist, name, uri, art_url, artist_uri, added,
+                 tracks, artists=()):
+        self.artist = artist
+        self.name = name
+        self.uri = uri
+        self.art_url = art_url
+        self.artist_uri = artist_uri
+        self.added = added
+        self.tracks = tracks
+        self.artists = artists
+
+    @classmethod
+    def from_dict(cls, d):
+        tracks = [Track.from_dict(t) for t in d['tracks']]
+        return cls(d['artist'], d['name'], d['uri'], d['art_url'],
+                   d['artist_uri'], d['added'], tracks,
+                   shared_artists(d.get('artists', ())))
+
+
+class CollectedTrack(Record):
+    """ A saved track, sharing its album's fields rather than copying them """
+    __slots__ = ('base', 'parent')
+    fields = Track.fields + ('albumartist', 'album', 'added', 'art_url')
+
+    def __init__(self, base, parent):
+        self.base = base
+        self.parent = parent
+
+    artist = property(lambda self: self.base['artist'])
+    track = property(lambda self: self.base['track'])
+    name = property(lambda self: self.base['name'])
+    uri = property(lambda self: self.base['uri'])
+    albumartist = property(lambda self: self.parent['artist'])
+    album = property(lambda self: self.parent['name'])
+    added = property(lambda self: self.parent['added'])
+    art_url = property(lambda self: self.parent['art_url'])
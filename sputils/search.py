@@ -1,4 +1,10 @@
-from . import common
+import itertools
+import sys
+
+from . import common, ratelimit, stats
+
+# the search endpoint refuses offsets past this point
+SEARCH_OFFSET_LIMIT = 1000
 
 
 def album_to_dict_searched(api_dict):
@@ -20,16 +26,58 @@ def track_to_dict_searched(api_dict):
     return {**common_dict, **searched}
 
 
-def search_albums(sp, qry):
-    searched = sp.search(qry, type='album', limit=50)
+def search_pages(max_results, total, limit=50):
+    """ Return (limit, offset) pairs for the search pages after the first """
+    end = min(max_results, total, SEARCH_OFFSET_LIMIT)
+
+    return [(min(limit, end - offset), offset)
+            for _, offset in common.limit_split(end, limit, limit)]
+
+
+def iter_search(sp, qry, search_type, transform, max_results=50,
+                scheduler=None, ordered=True):
+    """ Yield up to max_results unique search results as pages arrive
+
+    The first page gives the total number of results, after which the rest
+    of the pages are fetched concurrently.
+    """
+    scheduler = scheduler or ratelimit.Scheduler()
+    key = f'{search_type}s'
+
+    def helper(limit, offset):
+        searched = sp.search(qry, limit=limit, offset=offset,
+                             type=search_type)
+        return searched[key]
 
-    return [album_to_dict_searched(a) for a in searched['albums']['items']]
+    first = scheduler.call(helper, min(50, max_results), 0)
+    pages = search_pages(max_results, first.get('total', 0))
 
+    seen = set()
+    for page in itertools.chain([first],
+                                scheduler.map(helper, pages, ordered)):
+        yield from transform_page(page, transform, seen)
 
-def search_tracks(sp, qry):
-    searched = sp.search(qry, type='track', limit=50)
 
-    return [track_to_dict_searched(t) for t in searched['tracks']['items']]
+def transform_page(page, transform, seen):
+    """ Transform a page's results, skipping those in or added to seen """
+    items = []
+    with stats.phase('transform'):
+        for item in page['items']:
+            if item is None or item['uri'] in seen:
+                continue
+            seen.add(item['uri'])
+            items.append(transform(item))
+    return items
+
+
+def search_albums(sp, qry, max_results=50, scheduler=None):
+    return list(iter_search(sp, qry, 'album', album_to_dict_searched,
+                            max_results, scheduler))
+
+
+def search_tracks(sp, qry, max_results=50, scheduler=None):
+    return list(iter_search(sp, qry, 'track', track_to_dict_searched,
+                            max_results, scheduler))
 
 
 def artist_to_dict_searched(api_dict):
@@ -39,26 +87,122 @@ def artist_to_dict_searched(api_dict):
     }
 
 
-def search_artists(sp, qry):
-    searched = sp.search(qry, type='artist', limit=50)
+def search_artists(sp, qry, max_results=50, scheduler=None):
+    return list(iter_search(sp, qry, 'artist', artist_to_dict_searched,
+                            max_results, scheduler))
 
-    return [artist_to_dict_searched(a) for a in searched['artists']['items']]
 
+def search_playlists(sp, qry, max_results=50, scheduler=None):
+    return list(iter_search(sp, qry, 'playlist', common.playlist_to_dict,
+                            max_results, scheduler))
 
-def search_playlists(sp, qry):
-    searched = sp.search(qry, type='playlist', limit=50)
 
-    return [common.playlist_to_dict(p) for p in searched['playlists']['items']]
+SEARCH_TYPES = {
+    'albums': ('album', album_to_dict_searched),
+    'tracks': ('track', track_to_dict_searched),
+    'artists': ('artist', artist_to_dict_searched),
+    'playlists': ('playlist', common.playlist_to_dict),
+}
 
 
-def searcher(sp, qry, resource):
+def searcher(sp, qry, resource, max_results=50, scheduler=None):
     if resource == 'albums':
-        return search_albums(sp, qry)
+        return search_albums(sp, qry, max_results, scheduler)
     if resource == 'tracks':
-        return search_tracks(sp, qry)
+        return search_tracks(sp, qry, max_results, scheduler)
     if resource == 'artists':
-        return search_artists(sp, qry)
+        return search_artists(sp, qry, max_results, scheduler)
     if resource == 'playlists':
-        return search_playlists(sp, qry)
+        return search_playlists(sp, qry, max_results, scheduler)
 
     raise ValueError(f'{resource} is not a valid search resource')
+
+
+def iter_searcher(sp, qry, resource, max_results=50, scheduler=None,
+                  ordered=False):
+    """ Yield search results as each page arrives instead of all at once """
+    if resource not in SEARCH_TYPES:
+        raise ValueError(f'{resource} is not a valid search resource')
+
+    search_type, transform = SEARCH_TYPES[resource]
+    return iter_search(sp, qry, search_type, transform, max_results,
+                       scheduler, ordered)
+
+
+def normalize_query(qry):
+    return ' '.join(qry.split())
+
+
+def report_failed(line, error):
+    print(f'sputils: search failed for {line!r}: {error}', file=sys.stderr)
+
+
+def iter_batch_searcher(sp, queries, resource, max_results=50,
+                        scheduler=None, ordered=False, on_error=report_failed):
+    """ Search for many queries concurrently, tagging results by query
+
+    Results are tagged with the query's original line, but lines that are
+    the same once normalized are only searched once. Every query's first
+    page is fetched, then the rest of every query's pages, all through the
+    scheduler's one pool. A query that fails is passed to on_error with the
+    error instead of stopping the other queries.
+    """
+    if resource not in SEARCH_TYPES:
+        raise ValueError(f'{resource} is not a valid search resource')
+
+    scheduler = scheduler or ratelimit.Scheduler()
+    search_type, transform = SEARCH_TYPES[resource]
+    key = f'{search_type}s'
+
+    lines = {}
+    for line in dict.fromkeys(queries):
+        qry = normalize_query(line)
+        if qry:
+            lines.setdefault(qry, []).append(line)
+
+    def helper(qry, limit, offset):
+        searched = sp.search(qry, limit=limit, offset=offset,
+                             type=search_type)
+        return searched[key]
+
+    def fetch(qry, limit, offset):
+        try:
+            return qry, scheduler.call(helper, qry, limit, offset)
+        except Exception as e:
+            return qry, e
+
+    seen = {qry: set() for qry in lines}
+    failed = set()
+
+    def results(pages):
+        for qry, page in pages:
+            if isinstance(page, Exception):
+                if qry not in failed:
+                    failed.add(qry)
+                    for line in lines[qry]:
+                        on_error(line, page)
+                continue
+            items = transform_page(page, transform, seen[qry])
+            for line in lines[qry]:
+                yield from ({**i, 'query': line} for i in items)
+
+    firsts = [(qry, min(50, max_results), 0) for qry in lines]
+    rest = []
+    for qry, page in common.iter_pages(fetch, firsts,
+                                       scheduler.max_concurrency, ordered):
+        if not isinstance(page, Exception):
+            rest.extend((qry, limit, offset) for limit, offset
+                        in search_pages(max_results, page.get('total', 0)))
+        yield from results([(qry, page)])
+
+    yield from results(common.iter_pages(fetch, rest,
+                                         scheduler.max_concurrency, ordered))
+
+
+def batch_searcher(sp, queries, resource, max_results=50, scheduler=None,
+                   on_error=report_failed):
+    """ Search for many queries, grouping the results by query line """
+    position = {line: n for n, line in enumerate(dict.fromkeys(queries))}
+    items = iter_batch_searcher(sp, queries, resource, max_results,
+                                scheduler, True, on_error)
+    return sorted(items, key=lambda i: position[i['query']])
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+from . import database, search, stats
+
+
+def cache_path():
+    """ Return the path of the search cache database """
+    return os.path.expanduser('~/.cache/sputils/search.sqlite')
+
+
+class SearchCache(database.Database):
+    """ Size bounded sqlite cache of search api responses
+
+    Entries expire after ttl seconds, and once there are more than
+    max_entries the least recently used are evicted.
+    """
+
+    def __init__(self, path, ttl=24 * 60 * 60, max_entries=10000):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        with self.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS search_cache (
+                                key TEXT PRIMARY KEY,
+                                response TEXT NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS search_cache_accessed
+                            ON search_cache (accessed)''')
+
+    @staticmethod
+    def key(qry, search_type, market, limit, offset):
+        qry = search.normalize_query(qry).lower()
+        return json.dumps([qry, search_type, market, limit, offset])
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        stats.emit('cache', name='search', hit=hit)
+
+    def get(self, key):
+        """ Return a cached response, or None if missing or expired """
+        now = time.time()
+        with self.connection() as conn:
+            row = conn.execute('SELECT response, created FROM search_cache '
+                               'WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                self.count(False)
+                return None
+
+            conn.execute('UPDATE search_cache SET accessed = ? '
+                         'WHERE key = ?', (now, key))
+
+        self.count(True)
+        return json.loads(row[0])
+
+    def set(self, key, response):
+        now = time.time()
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO search_cache '
+                         'VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(response), now, now))
+            conn.execute('DELETE FROM search_cache WHERE created < ?',
+                         (now - self.ttl,))
+            conn.execute('''DELETE FROM search_cache WHERE key IN (
+                                SELECT key FROM search_cache
+                                ORDER BY accessed DESC
+                                LIMIT -1 OFFSET ?)''', (self.max_entries,))
+
+
+class CachingClient:
+    """ Wrap a spotify client so its searches go through a SearchCache
+
+    Everything other than search is passed straight through to the client.
+    With refresh set, cached responses are ignored but still replaced.
+    """
+
+    def __init__(self, sp, cache, refresh=False):
+        self.sp = sp
+        self.cache = cache
+        self.refresh = refresh
+
+    def __getattr__(self, name):
+        return getattr(self.sp, name)
+
+    def search(self, q, limit=10, offset=0, type='track', market=None):
+        key = self.cache.key(q, type, market, limit, offset)
+
+        if not self.refresh:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+
+        response = self.sp.search(q, limit=limit, offset=offset, type=type,
+                                  market=market)
+        self.cache.set(key, response)
+        return response
@@ -0,0 +1,34 @@
+import os
+
+from . import records, statefile
+
+SNAPSHOT_VERSION = 4
+
+
+def snapshot_path(user):
+    """ Return the path of the saved album snapshot for a user """
+    return os.path.expanduser(f'~/.cache/sputils/{user}_albums.json')
+
+
+def load_snapshot(path):
+    """ Load collected albums from a snapshot, or an empty list if unusable """
+    snapshot = statefile.load(path, SNAPSHOT_VERSION)
+    if snapshot is None:
+        return []
+
+    return [records.CollectedAlbum.from_dict(a)
+            for a in snapshot.get('albums', [])]
+
+
+def clear_snapshot(path):
+    """ Remove a snapshot so the next collection starts from scratch """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def save_snapshot(path, albums):
+    """ Atomically write collected albums to a snapshot file """
+    statefile.save(path, SNAPSHOT_VERSION, {'albums': albums},
+                   default=records.to_stored)
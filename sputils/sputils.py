@@ -5,7 +5,51 @@
 import os
 import sys
 
-from . import commandline, auth, common, collect, search
+from . import commandline, auth, common, filters, lazy, stats
+
+# most invocations only need a few of these, so import them as they're used
+aio = lazy.LazyModule(f'{__package__}.aio')
+daemon = lazy.LazyModule(f'{__package__}.daemon')
+httpcache = lazy.LazyModule(f'{__package__}.httpcache')
+following = lazy.LazyModule(f'{__package__}.following')
+collect = lazy.LazyModule(f'{__package__}.collect')
+library = lazy.LazyModule(f'{__package__}.library')
+localsearch = lazy.LazyModule(f'{__package__}.localsearch')
+query = lazy.LazyModule(f'{__package__}.query')
+ratelimit = lazy.LazyModule(f'{__package__}.ratelimit')
+search = lazy.LazyModule(f'{__package__}.search')
+searchcache = lazy.LazyModule(f'{__package__}.searchcache')
+snapshot = lazy.LazyModule(f'{__package__}.snapshot')
+
+
+def catalog_only(args):
+    """ Whether an action only reads the public catalog, needing no user """
+    if args.action == 'search':
+        return not args.local
+    return args.action == 'query' and args.resource[0] != 'playlists'
+
+
+def http_cache(args):
+    """ Return the user's http response cache, unless caching is off """
+    if args.no_cache:
+        return None
+    return httpcache.HttpCache(httpcache.cache_path(args.user))
+
+
+def read_query(args, stdin):
+    """ Return the query arguments, reading them from stdin when given - """
+    if args.query != ['-']:
+        return args.query
+
+    return [line.strip() for line in stdin if line.strip()]
+
+
+def write_output(items, args, out):
+    if args.stream:
+        common.write_items(items, args.format, args.line_format, out)
+    else:
+        common.write_formatted(items, args.format, args.line_format, out,
+                               args.compact)
 
 
 def main():
@@ -17,14 +61,227 @@ def main():
     except FileExistsError:
         pass
 
-    sp = auth.get_spotify_client(args.user, args.client_id, args.client_secret)
+    try:
+        if not args.stats:
+            return dispatch(args)
+
+        recorder = stats.Recorder()
+        stats.subscribe(recorder)
+        try:
+            return dispatch(args)
+        finally:
+            stats.unsubscribe(recorder)
+            print(recorder.report(args.stats), file=sys.stderr)
+    except BrokenPipeError:
+        # the reader, such as head, is gone; point stdout at devnull so
+        # flushing it on exit doesn't fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+
+def dispatch(args):
+    if args.daemon:
+        return main_daemon(args)
+
+    if args.engine == 'async':
+        return main_async(args)
+
+    if not args.no_daemon and not args.stats:
+        status = daemon.forward(daemon.socket_path(args.user), args,
+                                sys.stdin, sys.stdout)
+        if status is not None:
+            return status
+
+    sp = auth.LazyClient(lambda: auth.get_spotify_client(
+        args.user, args.client_id, args.client_secret, args.max_concurrency,
+        args.timeout, catalog_only=catalog_only(args),
+        http_cache=http_cache(args)))
+
+    scheduler = ratelimit.Scheduler(args.max_concurrency, args.rate_limit)
+
+    try:
+        run(args, sp, scheduler, sys.stdin, sys.stdout)
+    finally:
+        sp.close()
+
+
+def run(args, sp, scheduler, stdin, stdout, cache=None,
+        library_cache=None):
+    """ Run an action, writing its output to stdout or the output dir
+
+    The daemon passes its long lived search cache and in memory library,
+    otherwise the cache is opened for this run.
+    """
+    if args.action == 'search' and not args.no_cache and not args.local:
+        cache = cache or searchcache.SearchCache(searchcache.cache_path())
+        sp = searchcache.CachingClient(sp, cache, args.refresh)
 
+    with stats.phase('fetch'):
+        collected = fetch_collected(args, sp, scheduler, stdin, library_cache)
+    if collected is None:
+        return
+
+    # streamed items are only fetched as they're written
+    collected = {r: items if isinstance(items, list)
+                 else stats.timed_items(items, 'fetch')
+                 for r, items in collected.items()}
+
+    if args.action in ['save', 'delete'] and library_cache is not None:
+        library_cache.clear()
+
+    # streamed playlists are consumed as they're written
+    streamed = args.stream and library_cache is None
+    if args.action == 'collect' and 'playlists' in collected and \
+            not streamed:
+        localsearch.update_collected_playlists(
+            localsearch.index_path(args.user), collected['playlists'])
+
+    write_collected(collected, args, stdout)
+
+
+def fetch_collected(args, sp, scheduler, stdin, library_cache=None):
+    """ Run an action, returning a dict of resource to items """
     if args.action == 'collect':
-        items = collect.collector(sp, args.resource)
+        snapshot_path = snapshot.snapshot_path(args.user)
+        # items are saved newest first, so older pages needn't be fetched
+        since = filters.lower_bound(args.where, 'added')
+        if args.refresh:
+            snapshot.clear_snapshot(snapshot_path)
+        if library_cache is not None:
+            collected = library_cache.get(
+                args.resource, args.refresh,
+                lambda r: collect.collect_resources(sp, r, snapshot_path,
+                                                    scheduler))
+        elif args.stream:
+            resource = args.resource[0]
+            collected = {resource: collect.iter_collector(
+                sp, resource, snapshot_path, scheduler, args.ordered, since)}
+        else:
+            collected = collect.collect_resources(sp, args.resource,
+                                                  snapshot_path, scheduler,
+                                                  since)
+    elif args.action == 'search' and args.local:
+        qry = ' '.join(args.query)
+        resource = args.resource[0]
+        index = localsearch.LibraryIndex(localsearch.index_path(args.user))
+        localsearch.sync_index(index, sp, args.user, resource, scheduler,
+                               args.refresh)
+        collected = {resource: localsearch.local_searcher(
+            index, qry, resource, args.max_results)}
+    elif args.action == 'search' and args.batch:
+        queries = [line.strip() for line in stdin]
+        resource = args.resource[0]
+        if args.stream:
+            items = search.iter_batch_searcher(sp, queries, resource,
+                                               args.max_results, scheduler,
+                                               args.ordered)
+        else:
+            items = search.batch_searcher(sp, queries, resource,
+                                          args.max_results, scheduler)
+        collected = {resource: items}
     elif args.action == 'search':
         qry = ' '.join(args.query)
-        items = search.searcher(sp, qry, args.resource)
+        resource = args.resource[0]
+        if args.stream:
+            items = search.iter_searcher(sp, qry, resource, args.max_results,
+                                         scheduler, args.ordered)
+        else:
+            items = search.searcher(sp, qry, resource, args.max_results,
+                                    scheduler)
+        collected = {resource: items}
+    elif args.action == 'query':
+        uris = read_query(args, stdin)
+        resource = args.resource[0]
+        collected = {resource: query.querier(sp, uris, resource, args.user,
+                                             scheduler)}
+    elif args.action == 'save':
+        uris = read_query(args, stdin)
+        resource = args.resource[0]
+        collected = {resource: library.saver(sp, uris, resource, scheduler)}
+    elif args.action == 'delete':
+        uris = read_query(args, stdin)
+        resource = args.resource[0]
+        collected = {resource: library.deleter(sp, uris, resource,
+                                               scheduler)}
+    elif args.action == 'following':
+        resource = args.resource[0]
+        collected = {resource: following.follower(
+            sp, resource, following.state_path(args.user), scheduler,
+            args.refresh)}
+    else:
+        return None
+
+    return collected
+
+
+def main_daemon(args):
+    """ Serve invocations forwarded by other sputils processes
+
+    The connection pool, search cache and collected library stay warm
+    between invocations. Concurrency, timeout and rate limit settings are
+    the daemon's own.
+    """
+    session = auth.get_session(args.max_concurrency, http_cache(args))
+    clients = {c: auth.get_spotify_client(args.user, args.client_id,
+                                          args.client_secret,
+                                          timeout=args.timeout,
+                                          session=session, catalog_only=c)
+               for c in [False, True]}
+    scheduler = ratelimit.Scheduler(args.max_concurrency, args.rate_limit)
+    cache = searchcache.SearchCache(searchcache.cache_path())
+    library_cache = daemon.LibraryCache(args.daemon_ttl)
+
+    def run_request(request_args, stdin, stdout):
+        sp = clients[catalog_only(request_args)]
+        run(request_args, sp, scheduler, stdin, stdout, cache, library_cache)
+
+    try:
+        daemon.serve(daemon.socket_path(args.user), run_request)
+    finally:
+        auth.close_session(session)
+
+
+def main_async(args):
+    token = auth.get_token_manager(args.user, args.client_id,
+                                   args.client_secret, catalog_only(args))
+
+    client_args = {
+        'max_concurrency': args.max_concurrency,
+        'prefix': auth.api_prefix(aio.API_PREFIX),
+        'timeout': args.timeout,
+    }
+
+    with stats.phase('fetch'):
+        if args.action == 'collect':
+            collected = aio.run_collector(token, args.resource,
+                                          **client_args)
+        elif args.action == 'search':
+            qry = ' '.join(args.query)
+            resource = args.resource[0]
+            collected = {resource: aio.run_searcher(token, qry, resource,
+                                                    args.max_results,
+                                                    **client_args)}
+        else:
+            raise ValueError(f'{args.action} is not supported by the async '
+                             'engine')
+
+    write_collected(collected, args)
+
+
+def write_collected(collected, args, stdout=None):
+    for resource, items in collected.items():
+        if args.where or args.fields:
+            items = filters.filter_items(items, args.where, args.fields)
+
+        if args.output_dir is None:
+            with stats.phase('format'), \
+                    stats.timed_writer(stdout or sys.stdout) as out:
+                write_output(items, args, out)
+            continue
 
-    if args.action in ['collect', 'search']:
-        out = common.formatter(items, args.format, args.line_format)
-        print(out)
+        os.makedirs(args.output_dir, exist_ok=True)
+        fn = common.output_filename(resource, args.format)
+        with open(os.path.join(args.output_dir, fn), 'w') as f, \
+                stats.phase('format'), stats.timed_writer(f) as out:
+            write_output(items, args, out)
@@ -0,0 +1,30 @@
+import json
+import os
+
+
+def load(path, version):
+    """ Load a versioned json file, or None if missing, unreadable or stale """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(state, dict):
+        return None
+    if state.get('version') != version:
+        return None
+
+    return state
+
+
+def save(path, version, state, default=None):
+    """ Atomically write state with its version as json
+
+    The file is written beside path and then renamed over it, so readers
+    only ever see a complete file, even with concurrent runs.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version, **state}, f, default=default)
+    os.replace(tmp_path, path)
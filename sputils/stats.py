@@ -0,0 +1,289 @@
+import bisect
+import json
+import threading
+import time
+
+# callbacks receiving every event, as callback(event, fields)
+SUBSCRIBERS = []
+
+# upper bounds in milliseconds of the request latency histogram buckets
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def subscribe(callback):
+    """ Start sending events to a callback
+
+    Events are 'request' with method, url, status, seconds and bytes,
+    'retry' with error and attempt, 'phase' with name and seconds, and
+    'cache' with name and whether the lookup was a hit.
+    Callbacks may be called from any thread.
+    """
+    SUBSCRIBERS.append(callback)
+
+
+def unsubscribe(callback):
+    SUBSCRIBERS.remove(callback)
+
+
+def emit(event, **fields):
+    for callback in SUBSCRIBERS:
+        callback(event, fields)
+
+
+class NullContext:
+    """ Context manager doing nothing but giving a value, for Python 3.6 """
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def __enter__(self):
+        return self.value
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Phase:
+    """ Time a phase of a run, excluding any phases nested inside it """
+    local = threading.local()
+
+    def __init__(self, name):
+        self.name = name
+        self.nested = 0.0
+
+    def __enter__(self):
+        self.parent = getattr(self.local, 'current', None)
+        self.local.current = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.local.current = self.parent
+        if self.parent is not None:
+            self.parent.nested += elapsed
+
+        emit('phase', name=self.name, seconds=elapsed - self.nested)
+
+
+def phase(name):
+    """ Return a context manager timing a phase, if anyone is listening """
+    if not SUBSCRIBERS:
+        return NullContext()
+    return Phase(name)
+
+
+class TimedWriter:
+    """ File-like wrapper timing its writes as a single write phase
+
+    Writes are summed rather than timed as phases of their own, which would
+    cost more than the writes themselves for small lines.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        current = getattr(Phase.local, 'current', None)
+        if current is not None:
+            current.nested += self.seconds
+
+        emit('phase', name='write', seconds=self.seconds)
+
+    def write(self, data):
+        start = time.perf_counter()
+        written = self.out.write(data)
+        self.seconds += time.perf_counter() - start
+        return written
+
+    def flush(self):
+        start = time.perf_counter()
+        self.out.flush()
+        self.seconds += time.perf_counter() - start
+
+
+class TimedItems:
+    """ Iterator wrapper timing the work of producing its items as a phase
+
+    Lazy results, such as streamed pages, are fetched as the writer
+    consumes them. That time is summed into a single phase, as TimedWriter
+    does for writes, rather than counted towards the phase consuming them.
+    """
+
+    def __init__(self, items, name):
+        self.items = iter(items)
+        self.name = name
+        self.seconds = 0.0
+        self.nested = 0.0
+        self.exhausted = False
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        parent = getattr(Phase.local, 'current', None)
+        Phase.local.current = self
+        start = time.perf_counter()
+        try:
+            return next(self.items)
+        except StopIteration:
+            self.exhausted = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            Phase.local.current = parent
+            if parent is not None:
+                parent.nested += elapsed
+            self.seconds += elapsed
+            if self.exhausted:
+                self.close()
+
+    def close(self):
+        """ Close the items, emitting the phase once """
+        if self.closed:
+            return
+        self.closed = True
+
+        close = getattr(self.items, 'close', None)
+        if close is not None:
+            close()
+        emit('phase', name=self.name, seconds=self.seconds - self.nested)
+
+
+def timed_items(items, name):
+    """ Return items, timing their production if anyone is listening """
+    if not SUBSCRIBERS:
+        return items
+    return TimedItems(items, name)
+
+
+def timed_writer(out):
+    """ Return a context manager giving out, timed if anyone is listening """
+    if not SUBSCRIBERS:
+        return NullContext(out)
+    return TimedWriter(out)
+
+
+def response_hook(response, *args, **kwargs):
+    """ requests response hook emitting a request event """
+    if not SUBSCRIBERS:
+        return
+
+    # reading the body here keeps its transfer time in the latency
+    start = time.perf_counter()
+    size = len(response.content)
+    seconds = response.elapsed.total_seconds() + time.perf_counter() - start
+
+    # bodies revalidated by the http cache weren't transferred again
+    status = response.status_code
+    if getattr(response, 'revalidated', False):
+        status, size = 304, 0
+
+    emit('request', method=response.request.method, url=response.url,
+         status=status, seconds=seconds, bytes=size)
+
+
+class Recorder:
+    """ Subscriber aggregating events into the --stats report """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.bytes = 0
+        self.retries = 0
+        self.phases = {}
+        self.caches = {}
+
+    def __call__(self, event, fields):
+        with self.lock:
+            if event == 'request':
+                self.latencies.append(fields['seconds'])
+                status = fields['status']
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.bytes += fields['bytes']
+            elif event == 'retry':
+                self.retries += 1
+            elif event == 'phase':
+                seconds, calls = self.phases.get(fields['name'], (0.0, 0))
+                self.phases[fields['name']] = (seconds + fields['seconds'],
+                                               calls + 1)
+            elif event == 'cache':
+                hits, misses = self.caches.get(fields['name'], (0, 0))
+                if fields['hit']:
+                    hits += 1
+                else:
+                    misses += 1
+                self.caches[fields['name']] = (hits, misses)
+
+    def percentile(self, latencies, p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    def to_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            for latency in latencies:
+                bucket = bisect.bisect_left(LATENCY_BUCKETS, latency * 1000)
+                histogram[bucket] += 1
+
+            labels = [f'<={b}ms' for b in LATENCY_BUCKETS]
+            labels.append(f'>{LATENCY_BUCKETS[-1]}ms')
+
+            report = {
+                'requests': len(latencies),
+                'statuses': {str(s): n
+                             for s, n in sorted(self.statuses.items())},
+                'throttled': self.statuses.get(429, 0),
+                'retries': self.retries,
+                'bytes': self.bytes,
+                'latency_ms': {},
+                'histogram': dict(zip(labels, histogram)),
+                'phases': {name: {'seconds': round(s, 6), 'calls': calls}
+                           for name, (s, calls) in self.phases.items()},
+                'caches': {name: {'hits': hits, 'misses': misses}
+                           for name, (hits, misses) in self.caches.items()},
+            }
+
+        if latencies:
+            report['latency_ms'] = {
+                p: round(self.percentile(latencies, q) * 1000, 3)
+                for p, q in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99),
+                             ('max', 1.0)]}
+
+        return report
+
+    def report(self, report_format='table'):
+        """ Return the recorded stats as json or a plain text table """
+        report = self.to_dict()
+        if report_format == 'json':
+            return json.dumps(report, indent=4)
+
+        statuses = ', '.join(f'{s}: {n}'
+                             for s, n in report['statuses'].items())
+        lines = [
+            f'requests    {report["requests"]} ({statuses or "none"})',
+            f'retries     {report["retries"]}, '
+            f'{report["throttled"]} throttled',
+            f'bytes       {report["bytes"]}',
+        ]
+        if report['latency_ms']:
+            lines.append('latency     ' + ', '.join(
+                f'{p} {ms:.1f}ms' for p, ms in report['latency_ms'].items()))
+            lines += [f'  {label:>10} {n}'
+                      for label, n in report['histogram'].items() if n]
+
+        lines += [f'cache       {name}: {c["hits"]} hits, '
+                  f'{c["misses"]} misses'
+                  for name, c in report['caches'].items()]
+
+        lines.append('phase            seconds    calls')
+        lines += [f'  {name:12} {p["seconds"]:9.3f} {p["calls"]:8}'
+                  for name, p in report['phases'].items()]
+
+        return '\n'.join(lines)
@@ -39,5 +39,5 @@ def artist_dict_searched():
 
 
 @pytest.fixture
-def artist_dict_collected():
-    return helpers.mock_json('mocks/dicts/artist_collected.json')
+def artists_dict_collected():
+    return helpers.mock_json('mocks/dicts/artists_collected.json')
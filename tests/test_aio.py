@@ -0,0 +1,111 @@
+import copy
+import pytest
+import unittest.mock
+
+import deepdiff
+
+from sputils import aio, records
+
+
+class FakeAsyncSpotify:
+    def __init__(self, api_album, api_playlist, api_search):
+        self.api_album = api_album
+        self.api_playlist = api_playlist
+        self.api_search = api_search
+        self.calls = []
+
+    async def current_user_saved_albums(self, limit=20, offset=0):
+        self.calls.append(('albums', limit, offset))
+        return {'items': [self.api_album], 'total': 2}
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        self.calls.append(('playlists', limit, offset))
+        return {'items': [self.api_playlist], 'total': 2}
+
+    async def album_tracks(self, album_id, limit=50, offset=0):
+        self.calls.append(('tracks', limit, offset))
+        return {'items': []}
+
+    async def search(self, q, limit=10, offset=0, type='track'):
+        return self.api_search
+
+
+@pytest.fixture
+def async_sp(api_album_collected, api_playlist, sp_mock):
+    api_search = sp_mock.Spotify().search()
+    return FakeAsyncSpotify(api_album_collected, api_playlist, api_search)
+
+
+def test_collect_all_albums(async_sp, album_dict_collected):
+    expected = [album_dict_collected, album_dict_collected]
+
+    albums = aio.run(aio.collect_all_albums(async_sp, 1))
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+    assert async_sp.calls == [('albums', 1, 0), ('albums', 1, 1)]
+
+
+def test_collect_all_playlists(async_sp, playlist_dict):
+    expected = [playlist_dict, playlist_dict]
+
+    playlists = aio.run(aio.collect_all_playlists(async_sp, 1))
+
+    assert deepdiff.DeepDiff(playlists, expected) == {}
+
+
+def test_collect_resources(async_sp, artists_dict_collected, playlist_dict):
+    resources = ['artists', 'tracks', 'playlists']
+
+    collected = aio.run(aio.collect_resources(async_sp, resources))
+
+    assert list(collected) == resources
+    assert records.builtin_value(collected['artists']) == \
+        artists_dict_collected
+    assert len(collected['tracks']) == 1
+    assert collected['playlists'] == [playlist_dict]
+    assert [c[0] for c in async_sp.calls] == ['albums', 'playlists']
+
+    with pytest.raises(ValueError):
+        aio.run(aio.collect_resources(async_sp, ['test']))
+
+
+def test_searcher(async_sp, album_dict_searched, track_dict_searched):
+    albums = aio.run(aio.searcher(async_sp, 'test', 'albums'))
+    assert deepdiff.DeepDiff(albums, [album_dict_searched]) == {}
+
+    tracks = aio.run(aio.searcher(async_sp, 'test', 'tracks'))
+    assert deepdiff.DeepDiff(tracks, [track_dict_searched]) == {}
+
+    with pytest.raises(ValueError):
+        aio.run(aio.searcher(async_sp, 'test', 'test'))
+
+
+def test_searcher_max_results(api_album_searched):
+    calls = []
+
+    class PagedSpotify:
+        async def search(self, q, limit=10, offset=0, type='track'):
+            calls.append((limit, offset))
+            items = []
+            for n in range(offset, offset + limit):
+                item = copy.deepcopy(api_album_searched)
+                item['uri'] = f'spotify:album:{n}'
+                items.append(item)
+            return {'albums': {'items': items, 'total': 500}}
+
+    albums = aio.run(aio.searcher(PagedSpotify(), 'test', 'albums', 120))
+
+    assert len(albums) == 120
+    assert albums[119]['uri'] == 'spotify:album:119'
+    assert sorted(calls) == [(20, 100), (50, 0), (50, 50)]
+
+
+def test_auth_headers_token_manager():
+    token_manager = unittest.mock.Mock()
+    token_manager.get_access_token.side_effect = ['a', 'b']
+    sp = aio.AsyncSpotify(token_manager)
+
+    assert sp.auth_headers() == {'Authorization': 'Bearer a'}
+    assert sp.auth_headers() == {'Authorization': 'Bearer b'}
+    assert aio.AsyncSpotify('c').auth_headers() == {
+        'Authorization': 'Bearer c'}
@@ -1,9 +1,11 @@
+import unittest.mock
+
 import pytest
 
 from sputils import commandline
 
 
-@pytest.mark.parametrize('f', ['json', 'lines', 'yaml'])
+@pytest.mark.parametrize('f', ['json', 'ndjson', 'lines', 'yaml'])
 def test_parse_args_format(f, required_args):
     args = commandline.parse_args(f'--format {f} {required_args}')
 
@@ -14,7 +16,27 @@ def test_parse_args_format(f, required_args):
 def test_parse_args_resource(r, required_args):
     args = commandline.parse_args(f'--resource {r} {required_args}')
 
-    assert args.resource == r
+    assert args.resource == [r]
+
+
+def test_parse_args_resource_list(required_args):
+    args = commandline.parse_args(
+        f'-r albums,tracks,albums -o out {required_args}')
+
+    assert args.resource == ['albums', 'tracks']
+    assert args.output_dir == 'out'
+
+
+@pytest.mark.parametrize('a', [
+    '-r albums,test -o out',
+    '-r albums,tracks',
+    '-r albums,tracks -o out -a search test',
+    '-r albums,tracks -o out -f ndjson --stream',
+])
+def test_parse_args_resource_list_invalid(a, required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'{a} {required_args}')
+    assert e.value.code == 2
 
 
 @pytest.mark.parametrize('a', ['collect'])
@@ -36,3 +58,124 @@ def test_parse_args_no_query(required_args):
     with pytest.raises(SystemExit) as e:
         commandline.parse_args(f'-a search {required_args}')
     assert e.value.code == 2
+
+
+@pytest.mark.parametrize('f', ['ndjson', 'lines'])
+def test_parse_args_stream(f, required_args):
+    args = commandline.parse_args(f'-f {f} --stream {required_args}')
+
+    assert args.stream
+
+
+def test_parse_args_stream_format(required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'-f json --stream {required_args}')
+    assert e.value.code == 2
+
+
+def test_parse_args_save_resource(required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'-a save -r artists a {required_args}')
+    assert e.value.code == 2
+
+
+def test_parse_args_batch(required_args):
+    args = commandline.parse_args(f'-a search --batch {required_args}')
+
+    assert args.batch
+
+
+def test_parse_args_batch_action(required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'-a collect --batch {required_args}')
+    assert e.value.code == 2
+
+
+def test_parse_args_daemon_engine(required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'--daemon --engine async {required_args}')
+    assert e.value.code == 2
+
+
+@pytest.mark.parametrize('a, expected', [
+    ('', None), ('--stats', 'table'), ('--stats json', 'json')])
+def test_parse_args_stats(a, expected, required_args):
+    args = commandline.parse_args(f'{required_args} {a}')
+
+    assert args.stats == expected
+
+
+@pytest.mark.parametrize('a', ['-a query test', '-a save test',
+                               '-a delete test', '-a following'])
+@unittest.mock.patch('sputils.lazy.installed', return_value=True)
+def test_parse_args_async_action(installed_mock, a, required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'--engine async {a} {required_args}')
+    assert e.value.code == 2
+
+
+@unittest.mock.patch('sputils.lazy.installed')
+def test_parse_args_async_aiohttp(installed_mock, required_args, capsys):
+    installed_mock.return_value = True
+    args = commandline.parse_args(f'--engine async -a search test '
+                                  f'{required_args}')
+    assert args.engine == 'async'
+
+    installed_mock.return_value = False
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'--engine async {required_args}')
+    assert e.value.code == 2
+    assert 'needs aiohttp' in capsys.readouterr().err
+    installed_mock.assert_called_with('aiohttp')
+
+
+@pytest.mark.parametrize('a', ['-a collect --local',
+                               '-a search --batch --local',
+                               '-a search --engine async --local test'])
+def test_parse_args_local_invalid(a, required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'{a} {required_args}')
+    assert e.value.code == 2
+
+
+@pytest.mark.parametrize('a', ['--max_concurrency 0', '--max_concurrency -1',
+                               '--rate_limit 0', '--rate_limit -2'])
+def test_parse_args_limits_invalid(a, required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'{a} {required_args}')
+    assert e.value.code == 2
+
+
+def test_parse_args_limits(required_args):
+    args = commandline.parse_args(
+        f'--max_concurrency 1 --rate_limit 0.5 {required_args}')
+
+    assert (args.max_concurrency, args.rate_limit) == (1, 0.5)
+
+
+def test_parse_args_fields_where(required_args):
+    args = commandline.parse_args(
+        f'--fields uri,name --where added>=2024 --where artist~a '
+        f'{required_args}')
+
+    assert args.fields == ['uri', 'name']
+    assert args.where == ['added>=2024', 'artist~a']
+
+
+def test_parse_args_where_invalid(required_args):
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(f'--where added {required_args}')
+    assert e.value.code == 2
+
+
+@pytest.mark.parametrize('r, valid', [
+    ('albums', True), ('artists', True), ('tracks', False)])
+def test_parse_args_following_resource(r, valid, required_args):
+    a = f'-a following -r {r} {required_args}'
+    if valid:
+        assert commandline.parse_args(a).action == 'following'
+        return
+
+    with pytest.raises(SystemExit) as e:
+        commandline.parse_args(a)
+    assert e.value.code == 2
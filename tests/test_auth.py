@@ -1,7 +1,14 @@
-import pytest
+import concurrent.futures
+import http.server
+import socketserver
+import threading
+import time
 import unittest.mock
 
+import pytest
+
 import deepdiff
+import spotipy.oauth2
 
 from sputils import auth
 
@@ -32,11 +39,228 @@ def test_get_spotify_client(spotipy_mock):
     assert sp == expected
 
 
+@unittest.mock.patch('sputils.auth.get_session')
+@unittest.mock.patch('sputils.auth.spotipy')
+def test_get_spotify_client_session(spotipy_mock, get_session_mock):
+    sp_params = ('testuser', 'test_client_id', 'test_client_secret')
+    auth.get_spotify_client(*sp_params, pool_size=20, timeout=5)
+
+    get_session_mock.assert_called_once_with(20, None)
+    token_manager = spotipy_mock.Spotify.call_args[1][
+        'client_credentials_manager']
+    assert isinstance(token_manager, auth.TokenManager)
+    spotipy_mock.Spotify.assert_called_once_with(
+        client_credentials_manager=token_manager,
+        requests_session=get_session_mock.return_value,
+        requests_timeout=5)
+
+
+@unittest.mock.patch('sputils.auth.spotipy')
+def test_get_token_manager_catalog_only(spotipy_mock):
+    sp_params = ('testuser', 'test_client_id', 'test_client_secret')
+    token_manager = auth.get_token_manager(*sp_params, catalog_only=True)
+
+    credentials = spotipy_mock.oauth2.SpotifyClientCredentials
+    credentials.assert_called_once_with('test_client_id',
+                                        'test_client_secret')
+    assert token_manager.credentials == credentials.return_value
+    spotipy_mock.util.prompt_for_user_token.assert_not_called()
+
+
+@unittest.mock.patch('sputils.auth.spotipy')
+def test_get_user_credentials_prompt(spotipy_mock):
+    oauth = spotipy_mock.oauth2.SpotifyOAuth.return_value
+    oauth.get_cached_token.side_effect = [None, {'access_token': 'a'}]
+
+    sp_params = ('testuser', 'test_client_id', 'test_client_secret')
+    credentials = auth.get_user_credentials(*sp_params)
+
+    spotipy_mock.util.prompt_for_user_token.assert_called_once()
+    assert credentials.token_info == {'access_token': 'a'}
+
+
+def test_user_credentials_refresh():
+    oauth = unittest.mock.create_autospec(spotipy.oauth2.SpotifyOAuth)
+    oauth.refresh_access_token.return_value = {
+        'access_token': 'b', 'refresh_token': 'r',
+        'expires_at': time.time() + 3600}
+
+    credentials = auth.UserCredentials(oauth, {
+        'access_token': 'a', 'refresh_token': 'r',
+        'expires_at': time.time() + 120})
+    assert credentials.get_access_token() == 'a'
+
+    # refreshed a little before it expires
+    credentials.token_info['expires_at'] = time.time() + 30
+    assert credentials.get_access_token() == 'b'
+    assert credentials.get_access_token() == 'b'
+    oauth.refresh_access_token.assert_called_once_with('r')
+
+
+def test_user_credentials_refresh_failed():
+    oauth = unittest.mock.create_autospec(spotipy.oauth2.SpotifyOAuth)
+    oauth.refresh_access_token.return_value = None
+
+    credentials = auth.UserCredentials(oauth, {
+        'access_token': 'a', 'refresh_token': 'r',
+        'expires_at': time.time()})
+
+    with pytest.raises(RuntimeError, match='Unable to refresh'):
+        credentials.get_access_token()
+
+
+def test_token_manager_threads():
+    oauth = unittest.mock.create_autospec(spotipy.oauth2.SpotifyOAuth)
+
+    def refresh_access_token(refresh_token):
+        time.sleep(0.01)
+        return {'access_token': 'b', 'refresh_token': refresh_token,
+                'expires_at': time.time() + 3600}
+
+    oauth.refresh_access_token.side_effect = refresh_access_token
+    token_manager = auth.TokenManager(auth.UserCredentials(
+        oauth, {'access_token': 'a', 'refresh_token': 'r',
+                'expires_at': time.time() - 1}))
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        tokens = list(executor.map(lambda _: token_manager.get_access_token(),
+                                   range(8)))
+
+    assert tokens == ['b'] * 8
+    assert oauth.refresh_access_token.call_count == 1
+
+
+@unittest.mock.patch('sputils.auth.adapters')
+@unittest.mock.patch('sputils.auth.requests')
+def test_get_session(requests_mock, adapters_mock):
+    session = auth.get_session(20)
+
+    assert session == requests_mock.Session.return_value
+    adapters_mock.KeepAliveAdapter.assert_called_once_with(
+        pool_connections=4, pool_maxsize=20)
+    assert session.mount.call_count == 2
+
+
+class CountingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{"items": [], "total": 0}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CountingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def counting_server():
+    server = CountingServer(('127.0.0.1', 0), CountingHandler)
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_session_keeps_connections(counting_server, monkeypatch):
+    host, port = counting_server.server_address
+    monkeypatch.setenv(auth.API_PREFIX_ENV, f'http://{host}:{port}/v1/')
+    token_manager = auth.TokenManager(auth.StaticCredentials('token'))
+    session = auth.get_session(4)
+    sp = auth.get_spotify_client('user', 'id', 'secret', session=session,
+                                 token_manager=token_manager)
+
+    for _ in range(20):
+        sp.current_user_saved_albums(1)
+    assert counting_server.connections == 1
+
+    auth.close_session(session)
+    sp.current_user_saved_albums(1)
+    assert counting_server.connections == 2
+
+
+@unittest.mock.patch('sputils.auth.requests')
+@unittest.mock.patch('sputils.auth.httpcache')
+def test_get_session_http_cache(httpcache_mock, requests_mock):
+    cache = unittest.mock.Mock()
+    session = auth.get_session(20, cache)
+
+    httpcache_mock.CachingAdapter.assert_called_once_with(
+        cache, pool_connections=4, pool_maxsize=20)
+    requests_mock.adapters.HTTPAdapter.assert_not_called()
+    session.mount.assert_called_with(
+        'http://', httpcache_mock.CachingAdapter.return_value)
+
+
 @unittest.mock.patch('sputils.auth.spotipy')
 def test_get_spotify_client_token_failed(spotipy_mock):
     spotipy_mock.util.prompt_for_user_token.return_value = None
+    oauth = spotipy_mock.oauth2.SpotifyOAuth.return_value
+    oauth.get_cached_token.return_value = None
 
     exception_msg = 'Unable to retrieve authentication token'
     with pytest.raises(RuntimeError, match=exception_msg):
         sp_params = ('testuser', 'test_client_id', 'test_client_secret')
         auth.get_spotify_client(*sp_params)
+
+
+@unittest.mock.patch('sputils.auth.spotipy')
+def test_get_token(spotipy_mock):
+    spotipy_mock.util.prompt_for_user_token.return_value = 'token'
+
+    sp_params = ('testuser', 'test_client_id', 'test_client_secret')
+
+    assert auth.get_token(*sp_params) == 'token'
+
+
+@unittest.mock.patch.dict('os.environ', {
+    'SPUTILS_API_PREFIX': 'http://127.0.0.1:8099/v1/',
+    'SPUTILS_ACCESS_TOKEN': 'fake'})
+@unittest.mock.patch('sputils.auth.spotipy')
+def test_get_spotify_client_environment(spotipy_mock):
+    sp_params = ('testuser', 'test_client_id', 'test_client_secret')
+    sp = auth.get_spotify_client(*sp_params)
+
+    token_manager = spotipy_mock.Spotify.call_args[1][
+        'client_credentials_manager']
+    assert token_manager.get_access_token() == 'fake'
+    assert sp.prefix == 'http://127.0.0.1:8099/v1/'
+    spotipy_mock.util.prompt_for_user_token.assert_not_called()
+
+
+def test_lazy_client():
+    factory = unittest.mock.Mock()
+    client = auth.LazyClient(factory)
+    factory.assert_not_called()
+
+    assert client.search == factory.return_value.search
+    client.current_user_saved_albums(1)
+
+    factory.assert_called_once_with()
+
+
+@unittest.mock.patch('sputils.auth.close_session')
+def test_lazy_client_close(close_session_mock):
+    factory = unittest.mock.Mock()
+    client = auth.LazyClient(factory)
+
+    client.close()
+    factory.assert_not_called()
+    close_session_mock.assert_not_called()
+
+    client.search
+    client.close()
+    close_session_mock.assert_called_once_with(
+        factory.return_value._session)
@@ -3,12 +3,13 @@
 
 """Tests for collection functions."""
 
+import copy
 import pytest
 import unittest.mock
 
 import deepdiff
 
-from sputils import collect
+from sputils import collect, records, snapshot
 
 
 def test_album_to_dict_collected(api_album_collected, album_dict_collected):
@@ -17,13 +18,40 @@ def test_album_to_dict_collected(api_album_collected, album_dict_collected):
     assert deepdiff.DeepDiff(album, album_dict_collected) == {}
 
 
+def test_complete_album_tracks(api_album_collected):
+    api_album = copy.deepcopy(api_album_collected)
+    tracks = api_album['album']['tracks']
+    tracks['next'] = 'next'
+    tracks['total'] = 103
+    short_album = copy.deepcopy(api_album_collected)
+
+    sp = unittest.mock.Mock()
+    sp.album_tracks.side_effect = lambda uri, limit, offset: {
+        'items': [{'name': offset}]}
+
+    collect.complete_album_tracks(sp, [api_album, short_album])
+
+    names = [t['name'] for t in tracks['items']]
+    assert names == ['track', 1, 51, 101]
+    assert short_album == api_album_collected
+    assert sp.album_tracks.call_count == 3
+
+
+def test_complete_album_tracks_single_page(api_album_collected):
+    sp = unittest.mock.Mock()
+
+    collect.complete_album_tracks(sp, [api_album_collected])
+
+    sp.album_tracks.assert_not_called()
+
+
 def test_collect_albums(sp_mock, album_dict_collected):
     expected = [album_dict_collected]
 
     sp = sp_mock.Spotify()
     albums = collect.collect_albums(sp, 1, 0)
 
-    assert deepdiff.DeepDiff(albums, expected) == {}
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
 
 
 def test_collect_all_albums(sp_mock, album_dict_collected):
@@ -32,7 +60,145 @@ def test_collect_all_albums(sp_mock, album_dict_collected):
     sp = sp_mock.Spotify()
     albums = collect.collect_all_albums(sp, 1)
 
-    assert deepdiff.DeepDiff(albums, expected) == {}
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+
+
+def saved_albums_page(api_album, uris, total):
+    items = []
+    for uri, added in uris:
+        a = copy.deepcopy(api_album)
+        a['album']['uri'] = uri
+        a['added_at'] = added
+        items.append(a)
+
+    return {'items': items, 'total': total}
+
+
+def known_albums(album_dict, uris):
+    return [{**album_dict, 'uri': uri, 'added': added} for uri, added in uris]
+
+
+def test_sync_albums_unchanged(api_album_collected, album_dict_collected):
+    uris = [('a', '3'), ('b', '2'), ('c', '1')]
+    known = known_albums(album_dict_collected, uris)
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.return_value = saved_albums_page(
+        api_album_collected, uris, 3)
+
+    albums = collect.sync_albums(sp, known)
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), known) == {}
+    sp.current_user_saved_albums.assert_called_once()
+
+
+def test_sync_albums_added(api_album_collected, album_dict_collected):
+    uris = [('d', '4'), ('e', '4'), ('a', '3')]
+    known = known_albums(album_dict_collected, [('a', '3'), ('b', '2')])
+    expected = known_albums(album_dict_collected, uris[:2]) + known
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, uris[:2], 4),
+        saved_albums_page(api_album_collected, uris[2:], 4),
+    ]
+
+    albums = collect.sync_albums(sp, known, 2)
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+    assert sp.current_user_saved_albums.call_count == 2
+
+
+def test_sync_albums_newest_removed(api_album_collected, album_dict_collected):
+    known = known_albums(album_dict_collected, [('a', '3'), ('b', '2')])
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.return_value = saved_albums_page(
+        api_album_collected, [('b', '2')], 1)
+
+    albums = collect.sync_albums(sp, known)
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), known[1:]) == {}
+
+
+def test_sync_albums_removed(api_album_collected, album_dict_collected):
+    known = known_albums(album_dict_collected,
+                         [('a', '3'), ('b', '2'), ('c', '1')])
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, [('a', '3')], 2),
+        saved_albums_page(api_album_collected, [('c', '1')], 2),
+    ]
+
+    albums = collect.sync_albums(sp, known, 1)
+
+    # the old albums are reused, rather than completed again
+    assert albums == [known[0], known[2]]
+    assert sp.current_user_saved_albums.call_count == 2
+    sp.album_tracks.assert_not_called()
+
+
+def test_sync_albums_reordered(api_album_collected, album_dict_collected):
+    known = known_albums(album_dict_collected,
+                         [('a', '3'), ('b', '2'), ('c', '1')])
+    uris = [('a', '3'), ('c', '1'), ('e', '0')]
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, uris[:2], 3),
+        saved_albums_page(api_album_collected, uris[2:], 3),
+    ]
+
+    albums = collect.sync_albums(sp, known, 2)
+
+    assert [a['uri'] for a in albums] == ['a', 'c', 'e']
+    assert albums[:2] == [known[0], known[2]]
+
+
+def test_sync_albums_changed_while_paging(api_album_collected,
+                                          album_dict_collected):
+    known = known_albums(album_dict_collected,
+                         [('a', '3'), ('b', '2'), ('c', '1')])
+
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, [('a', '3')], 2),
+        saved_albums_page(api_album_collected, [], 2),
+    ]
+
+    assert collect.sync_albums(sp, known, 1) is None
+
+
+def test_sync_albums_empty(sp_mock):
+    sp = sp_mock.Spotify()
+
+    assert collect.sync_albums(sp, []) is None
+    sp.current_user_saved_albums.assert_not_called()
+
+
+def test_collect_synced_albums(tmp_path, sp_mock, album_dict_collected):
+    path = str(tmp_path / 'albums.json')
+    expected = [album_dict_collected, album_dict_collected]
+
+    sp = sp_mock.Spotify()
+    albums = collect.collect_synced_albums(sp, path, 1)
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+    assert deepdiff.DeepDiff(
+        records.builtin_value(snapshot.load_snapshot(path)), expected) == {}
+
+
+def test_iter_synced_albums(tmp_path, sp_mock, album_dict_collected):
+    path = str(tmp_path / 'albums.json')
+    expected = [album_dict_collected, album_dict_collected]
+
+    sp = sp_mock.Spotify()
+    albums = list(collect.iter_synced_albums(sp, path, 1))
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+    assert deepdiff.DeepDiff(
+        records.builtin_value(snapshot.load_snapshot(path)), expected) == {}
 
 
 def test_collect_all_tracks(sp_mock, track_dict_collected):
@@ -49,16 +215,45 @@ def test_collect_all_tracks(sp_mock, track_dict_collected):
     sp = sp_mock.Spotify()
     tracks = collect.collect_all_tracks(sp, 1)
 
-    assert deepdiff.DeepDiff(tracks, expected) == {}
+    assert deepdiff.DeepDiff(records.builtin_value(tracks), expected) == {}
 
 
-def test_collect_all_artists(sp_mock, artist_dict_collected):
-    expected = [artist_dict_collected]
+def test_collect_all_artists(sp_mock, artists_dict_collected):
+    expected = artists_dict_collected
 
     sp = sp_mock.Spotify()
     artists = collect.collect_all_artists(sp)
 
-    assert deepdiff.DeepDiff(artists, expected) == {}
+    assert deepdiff.DeepDiff(records.builtin_value(artists), expected) == {}
+
+
+def test_artist_index():
+    a = ('a', 'a_uri')
+    b = ('b', 'b_uri')
+    local = ('local', None)
+
+    def album(uri, added, artists, track_artists):
+        tracks = [{'artists': t} for t in track_artists]
+        return {'uri': uri, 'added': added, 'artists': artists,
+                'tracks': tracks}
+
+    first = album('1', '2019', [a], [[a], [a, b]])
+    second = album('2', '2021', [b], [[b], [local]])
+
+    index = collect.ArtistIndex([first])
+    assert [(x['name'], x['album_count'], x['track_count'])
+            for x in index.values()] == [('a', 1, 2), ('b', 1, 1)]
+
+    index.add_album(second)
+    artists = {x['name']: x for x in index.values()}
+
+    assert list(artists) == ['a', 'b', 'local']
+    assert artists['b']['albums'] == [first, second]
+    assert artists['b']['album_count'] == 2
+    assert artists['b']['track_count'] == 2
+    assert artists['b']['added'] == '2021'
+    assert artists['a']['added'] == '2019'
+    assert artists['local']['uri'] is None
 
 
 def test_collect_playlists(sp_mock, playlist_dict):
@@ -100,3 +295,115 @@ def test_collector(mock_car, mock_cp, mock_ct, mock_ca, sp_mock):
 
     with pytest.raises(ValueError) as e:
         collect.collector(sp, 'test')
+
+
+@unittest.mock.patch('sputils.collect.collect_library_albums')
+def test_collect_resources(mock_cla, sp_mock, api_album_collected,
+                           album_dict_collected, artists_dict_collected,
+                           playlist_dict):
+    mock_cla.return_value = [
+        collect.album_to_record_collected(api_album_collected)]
+    resources = ['albums', 'tracks', 'artists', 'playlists']
+
+    sp = sp_mock.Spotify()
+    collected = collect.collect_resources(sp, resources)
+
+    mock_cla.assert_called_once()
+    assert list(collected) == resources
+    assert records.builtin_value(collected['albums']) == \
+        [album_dict_collected]
+    assert len(collected['tracks']) == 1
+    assert records.builtin_value(collected['artists']) == \
+        artists_dict_collected
+    assert collected['playlists'] == [playlist_dict]
+
+    with pytest.raises(ValueError):
+        collect.collect_resources(sp, ['test'])
+
+
+@unittest.mock.patch('sputils.collect.collect_library_albums')
+def test_collect_resources_since(mock_cla, api_album_collected):
+    mock_cla.return_value = [
+        collect.album_to_record_collected(api_album_collected)]
+    sp = unittest.mock.Mock()
+
+    collect.collect_resources(sp, ['albums', 'tracks'], since='3')
+    assert mock_cla.call_args[1]['since'] == '3'
+
+    # artists sum up every album, so they never page by date
+    collect.collect_resources(sp, ['albums', 'artists'], since='3')
+    assert mock_cla.call_args[1]['since'] is None
+
+
+@unittest.mock.patch('sputils.collect.iter_library_albums')
+def test_iter_collector_artists_since(mock_ila, api_album_collected):
+    mock_ila.return_value = iter([
+        collect.album_to_record_collected(api_album_collected)])
+
+    artists = list(collect.iter_collector(unittest.mock.Mock(), 'artists',
+                                          since='3'))
+
+    assert len(artists) == 2
+    assert 'since' not in mock_ila.call_args[1]
+
+
+def test_iter_collector(sp_mock, album_dict_collected, playlist_dict):
+    sp = sp_mock.Spotify()
+
+    albums = records.builtin_value(list(collect.iter_collector(sp, 'albums')))
+    assert deepdiff.DeepDiff(albums, [album_dict_collected]) == {}
+
+    playlists = list(collect.iter_collector(sp, 'playlists', ordered=True))
+    assert deepdiff.DeepDiff(playlists, [playlist_dict]) == {}
+
+    tracks = list(collect.iter_collector(sp, 'tracks'))
+    assert len(tracks) == 1
+
+    with pytest.raises(ValueError):
+        collect.iter_collector(sp, 'test')
+
+
+def test_iter_albums_since(api_album_collected):
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, [('a', '5'), ('b', '4')], 6),
+        saved_albums_page(api_album_collected, [('c', '3'), ('d', '2')], 6),
+        saved_albums_page(api_album_collected, [('e', '1'), ('f', '0')], 6),
+    ]
+
+    albums = list(collect.iter_albums_since(sp, '3', 2))
+
+    assert [a['uri'] for a in albums] == ['a', 'b', 'c']
+    assert sp.current_user_saved_albums.call_count == 2
+
+
+def test_iter_albums_since_all(api_album_collected):
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.side_effect = [
+        saved_albums_page(api_album_collected, [('a', '5'), ('b', '4')], 3),
+        saved_albums_page(api_album_collected, [('c', '3')], 3),
+    ]
+
+    albums = list(collect.iter_albums_since(sp, '0', 2))
+
+    assert [a['uri'] for a in albums] == ['a', 'b', 'c']
+
+
+def test_collect_library_albums_since(tmp_path, api_album_collected,
+                                      album_dict_collected):
+    sp = unittest.mock.Mock()
+    sp.current_user_saved_albums.return_value = saved_albums_page(
+        api_album_collected, [('a', '5'), ('b', '1')], 2)
+    path = str(tmp_path / 'albums.json')
+
+    albums = collect.collect_library_albums(sp, snapshot_path=path,
+                                            since='3')
+    assert [a['uri'] for a in albums] == ['a']
+    assert not tmp_path.joinpath('albums.json').exists()
+
+    # an existing snapshot is synced rather than paged by date
+    known = known_albums(album_dict_collected, [('a', '5'), ('b', '1')])
+    snapshot.save_snapshot(path, known)
+    albums = collect.collect_library_albums(sp, snapshot_path=path,
+                                            since='3')
+    assert [a['uri'] for a in albums] == ['a', 'b']
@@ -3,11 +3,18 @@
 
 """Tests for common functions."""
 
+import io
+import json
+import threading
+import time
 import unittest.mock
 
+import pytest
+
 import deepdiff
+import yaml
 
-from sputils import common
+from sputils import common, records
 
 
 def test_limit_split():
@@ -18,6 +25,66 @@ def test_limit_split():
     assert splits == expected
 
 
+def test_iter_pages_ordered():
+    def fetch(n):
+        time.sleep(0.05 if n == 0 else 0)
+        return n
+
+    pages = list(common.iter_pages(fetch, [(0,), (1,), (2,)], 3, True))
+
+    assert pages == [0, 1, 2]
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_iter_pages_window(ordered):
+    pulled = []
+
+    def args():
+        for n in range(100):
+            pulled.append(n)
+            yield (n,)
+
+    pages = []
+    for page in common.iter_pages(lambda n: n, args(), 4, ordered):
+        assert len(pulled) - len(pages) <= 4
+        pages.append(page)
+
+    assert sorted(pages) == list(range(100))
+    if ordered:
+        assert pages == list(range(100))
+
+
+def test_iter_pages_unordered():
+    release = threading.Event()
+
+    def fetch(n):
+        if n == 0:
+            release.wait(1)
+        return n
+
+    pages = common.iter_pages(fetch, [(0,), (1,)], 2)
+    first = next(pages)
+    release.set()
+
+    assert [first, *pages] == [1, 0]
+
+
+def test_track_number():
+    assert common.track_number(1, 2) == 1.02
+    assert common.track_number(2, 10) == 2.1
+    assert common.track_number(1, 100) == 1.1
+
+
+def test_formatter_records(album_dict_collected):
+    album = records.CollectedAlbum.from_dict(album_dict_collected)
+
+    out = common.formatter([album], 'json', None)
+    assert json.loads(out) == [album_dict_collected]
+
+    out = common.formatter([album], 'yaml', None)
+    assert yaml.safe_load(out) == [album_dict_collected]
+
+
 def test_track_to_dict_common(api_track_collected, track_dict_collected):
     track = common.track_to_dict_common(api_track_collected)
 
@@ -44,6 +111,44 @@ def test_format_dict(album_dict_collected):
     assert formatted == expected
 
 
+def test_compile_line_format(track_dict_searched):
+    render = common.compile_line_format(
+        '{album.name} / {name:>8.3}|{missing|n/a}|{track:05.2f}!r{uri!r}')
+
+    assert render(track_dict_searched) == "album /      tra|n/a|01.01!r'uri'"
+
+
+def test_compile_line_format_index():
+    item = {'album': {'name': 'album', 'a.b': 1}, 'tracks': [{'name': 't'}]}
+    line_format = '{album[name]} {tracks[0][name]} {tracks[0].name}'
+
+    assert common.compile_line_format(line_format)(item) == 'album t t'
+    assert common.format_dict(item, '{album[a.b]}') == '1'
+    assert common.format_dict(item, '{album[name]}') == \
+        '{album[name]}'.format(**item)
+
+
+def test_compile_line_format_cached():
+    assert common.compile_line_format('{name}') is \
+        common.compile_line_format('{name}')
+
+
+def test_compile_line_format_missing(track_dict_searched):
+    render = common.compile_line_format('{album.missing}')
+
+    with pytest.raises(KeyError):
+        render(track_dict_searched)
+
+    render = common.compile_line_format('{name.inner|x} {{}}')
+    assert render(track_dict_searched) == 'x {}'
+
+
+@pytest.mark.parametrize('line_format', ['{}', '{name:{width}}'])
+def test_compile_line_format_invalid(line_format):
+    with pytest.raises(ValueError):
+        common.compile_line_format(line_format)
+
+
 def test_format_lines(album_dict_collected):
     expected = 'album\nalbum'
     albums = [album_dict_collected, album_dict_collected]
@@ -52,6 +157,94 @@ def test_format_lines(album_dict_collected):
     assert lines == expected
 
 
+def test_format_item():
+    item = {'name': 'album', 'uri': 'uri'}
+
+    assert common.format_item(item, 'ndjson', None) == \
+        '{"name":"album","uri":"uri"}'
+    assert common.format_item(item, 'lines', '{uri}') == 'uri'
+
+    with pytest.raises(ValueError):
+        common.format_item(item, 'yaml', None)
+
+
+def iter_items():
+    for name in 'abc':
+        yield {'name': name}
+
+
+def test_write_items_broken_pipe():
+    out = unittest.mock.Mock()
+    out.flush.side_effect = BrokenPipeError
+    items = iter_items()
+
+    with pytest.raises(BrokenPipeError):
+        common.write_items(items, 'lines', '{name}', out)
+
+    assert out.write.call_count == 1
+    assert items.gi_frame is None
+
+
+def test_write_items():
+    out = io.StringIO()
+    items = [{'name': 'a'}, {'name': 'b'}]
+
+    common.write_items(items, 'lines', '{name}', out)
+
+    assert out.getvalue() == 'a\nb\n'
+
+
+def test_dump_json():
+    obj = [{'name': 'a', 'tracks': [1, 2]}]
+
+    assert common.dump_json(obj) == json.dumps(obj, indent=4)
+    assert json.loads(common.dump_json(obj, compact=True)) == obj
+    assert ' ' not in common.dump_json(obj, compact=True)
+
+
+@unittest.mock.patch('sputils.common.get_orjson', lambda: None)
+def test_dump_json_no_orjson():
+    obj = [{'name': 'a', 'tracks': [1, 2]}]
+
+    assert common.dump_json(obj, compact=True) == \
+        '[{"name":"a","tracks":[1,2]}]'
+
+
+@pytest.mark.parametrize('output_format', ['json', 'yaml', 'ndjson'])
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('n', [0, 1, 3])
+def test_write_formatted(output_format, compact, n, album_dict_collected):
+    items = [{**album_dict_collected, 'name': f'album{i}'} for i in range(n)]
+    out = io.StringIO()
+
+    common.write_formatted(items, output_format, None, out, compact)
+
+    expected = common.formatter(items, output_format, None, compact)
+    assert out.getvalue().rstrip('\n') == expected.rstrip('\n')
+
+
+def test_write_formatted_lines():
+    out = io.StringIO()
+
+    common.write_formatted([{'name': 'a'}, {'name': 'b'}], 'lines', '{name}',
+                           out)
+
+    assert out.getvalue() == 'a\nb\n'
+
+
+def test_output_filename():
+    assert common.output_filename('albums', 'json') == 'albums.json'
+    assert common.output_filename('tracks', 'lines') == 'tracks.txt'
+
+
+def test_formatter_ndjson():
+    items = [{'name': 'a'}, {'name': 'b'}]
+
+    out = common.formatter(items, 'ndjson', None)
+
+    assert out == '{"name":"a"}\n{"name":"b"}'
+
+
 @unittest.mock.patch('sputils.common.json.dumps')
 @unittest.mock.patch('sputils.common.format_lines')
 @unittest.mock.patch('sputils.common.yaml.dump')
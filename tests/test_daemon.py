@@ -0,0 +1,130 @@
+import argparse
+import io
+import os
+import threading
+import unittest.mock
+
+import pytest
+
+from sputils import daemon
+
+
+def make_args(**kwargs):
+    defaults = {'action': 'collect', 'query': [], 'batch': False,
+                'output_dir': None}
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+@pytest.fixture
+def server(tmp_path):
+    requests = []
+
+    def run_request(args, stdin, stdout):
+        requests.append((args, stdin.read()))
+        if args.action == 'fail':
+            raise ValueError('bad request')
+        stdout.write('first\n')
+        stdout.write('second\n')
+
+    path = str(tmp_path / 'test.sock')
+    server = daemon.make_server(path, run_request)
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs={'poll_interval': 0.01})
+    thread.start()
+
+    yield path, requests
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_forward(server):
+    path, requests = server
+    out = io.StringIO()
+
+    status = daemon.forward(path, make_args(output_dir='out'),
+                            io.StringIO('ignored\n'), out)
+
+    assert status == 0
+    assert out.getvalue() == 'first\nsecond\n'
+
+    args, stdin = requests[0]
+    assert args.output_dir == os.path.abspath('out')
+    assert stdin == ''
+
+
+def test_forward_stdin(server):
+    path, requests = server
+
+    args = make_args(action='query', query=['-'])
+    daemon.forward(path, args, io.StringIO('a\nb\n'), io.StringIO())
+
+    assert requests[0][1] == 'a\nb\n'
+
+
+def test_forward_error(server, capsys):
+    path, _ = server
+    out = io.StringIO()
+
+    assert daemon.forward(path, make_args(action='fail'), io.StringIO(),
+                          out) == 1
+    assert out.getvalue() == ''
+    assert 'ValueError: bad request' in capsys.readouterr().err
+
+
+def test_frame_writer():
+    wfile = io.BytesIO()
+    out = daemon.FrameWriter(wfile, frame_size=10)
+
+    for n in range(6):
+        out.write(f'{n}\n')
+    assert wfile.getvalue() == b'{"data": "0\\n1\\n2\\n3\\n4\\n"}\n'
+
+    out.send({'exit': 0})
+    assert wfile.getvalue().split(b'\n')[1:] == \
+        [b'{"data": "5\\n"}', b'{"exit": 0}', b'']
+
+
+def test_forward_no_daemon(tmp_path):
+    path = str(tmp_path / 'missing.sock')
+    assert daemon.forward(path, make_args(), io.StringIO(),
+                          io.StringIO()) is None
+
+
+def test_make_server_listening(server):
+    path, _ = server
+    with pytest.raises(RuntimeError):
+        daemon.make_server(path, None)
+
+
+def test_make_server_stale_socket(tmp_path):
+    path = str(tmp_path / 'stale.sock')
+    open(path, 'w').close()
+
+    server = daemon.make_server(path, None)
+    server.server_close()
+
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+
+
+@unittest.mock.patch('sputils.daemon.time')
+def test_library_cache(mock_time):
+    mock_time.monotonic.return_value = 0
+    fetch = unittest.mock.Mock(side_effect=lambda rs: {r: [r] for r in rs})
+    cache = daemon.LibraryCache(ttl=60)
+
+    assert cache.get(['albums'], False, fetch) == {'albums': ['albums']}
+    assert cache.get(['albums', 'tracks'], False, fetch) == {
+        'albums': ['albums'], 'tracks': ['tracks']}
+    assert fetch.call_args_list == [unittest.mock.call(['albums']),
+                                    unittest.mock.call(['tracks'])]
+
+    cache.get(['albums'], True, fetch)
+    mock_time.monotonic.return_value = 61
+    cache.get(['tracks'], False, fetch)
+    assert fetch.call_count == 4
+
+    cache.clear()
+    cache.get(['albums'], False, fetch)
+    assert fetch.call_count == 5
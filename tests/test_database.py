@@ -0,0 +1,27 @@
+import threading
+
+from sputils import database
+
+
+class UnsyncedDatabase(database.Database):
+    pragmas = ('synchronous=OFF',)
+
+
+def test_connection_per_thread(tmp_path):
+    db = database.Database(str(tmp_path / 'test.sqlite'))
+    conn = db.connection()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.connection()))
+    thread.start()
+    thread.join()
+
+    assert db.connection() is conn
+    assert other[0] is not conn
+    assert conn.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+
+
+def test_pragmas(tmp_path):
+    db = UnsyncedDatabase(str(tmp_path / 'test.sqlite'))
+
+    assert db.connection().execute('PRAGMA synchronous').fetchone() == (0,)
@@ -0,0 +1,75 @@
+import pytest
+
+from sputils import filters, records
+
+ITEMS = [
+    {'name': 'Airbag', 'artist': 'Radiohead', 'track': 1.01,
+     'added': '2024-03-01T10:00:00Z', 'album': {'name': 'OK Computer'}},
+    {'name': 'The Gift', 'artist': 'The Velvet Underground', 'track': 1.02,
+     'added': '2023-12-31T23:00:00Z', 'album': {'name': 'White Light'}},
+    {'name': 'Untitled', 'artist': None, 'track': 2.01,
+     'added': '2024-01-01T00:00:00Z'},
+]
+
+
+def names(items):
+    return [i['name'] for i in items]
+
+
+@pytest.mark.parametrize('condition, expected', [
+    ('added>=2024-01-01', ['Airbag', 'Untitled']),
+    ('added<2024-01-01', ['The Gift']),
+    ('added > 2024-01-01T00:00:00Z', ['Airbag']),
+    ('track=1.01', ['Airbag']),
+    ('track!=1.01', ['The Gift', 'Untitled']),
+    ('track>=1.02', ['The Gift', 'Untitled']),
+    ('artist~^The ', ['The Gift']),
+    ('artist~(?i)radio', ['Airbag']),
+    ('album.name~OK', ['Airbag']),
+    ('artist!=Radiohead', ['The Gift']),
+    ('name=The Gift', ['The Gift']),
+])
+def test_parse_condition(condition, expected):
+    predicate = filters.parse_condition(condition)
+
+    assert names(i for i in ITEMS if predicate(i)) == expected
+
+
+@pytest.mark.parametrize('condition', ['added', '>=2024', 'artist~(',
+                                       'a b=c'])
+def test_parse_condition_invalid(condition):
+    with pytest.raises(ValueError):
+        filters.parse_condition(condition)
+
+
+def test_parse_where():
+    assert filters.parse_where([]) is None
+
+    predicate = filters.parse_where(['added>=2024', 'track<2'])
+    assert names(i for i in ITEMS if predicate(i)) == ['Airbag']
+
+
+def test_lower_bound():
+    conditions = ['added>=2023-01-01', 'added>2024-01-01', 'added<2025',
+                  'name=added']
+    assert filters.lower_bound(conditions, 'added') == '2024-01-01'
+    assert filters.lower_bound(['added<2025'], 'added') is None
+    assert filters.lower_bound(None, 'added') is None
+
+
+def test_filter_items_fields():
+    items = filters.filter_items(ITEMS, ['added>=2024'],
+                                 ['name', 'album.name'])
+
+    assert list(items) == [
+        {'name': 'Airbag', 'album.name': 'OK Computer'},
+        {'name': 'Untitled', 'album.name': None},
+    ]
+
+
+def test_filter_items_records():
+    track = records.Track('artist', 1.01, 'name', 'uri')
+
+    assert list(filters.filter_items([track], ['uri=uri'])) == [track]
+    assert list(filters.filter_items([track], None, ['uri'])) == [
+        {'uri': 'uri'}]
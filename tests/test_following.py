@@ -0,0 +1,132 @@
+import unittest.mock
+
+import pytest
+
+from sputils import following
+
+
+def api_artist(n):
+    return {'name': f'artist{n}', 'id': f'a{n}', 'uri': f'spotify:artist:a{n}'}
+
+
+def api_release(n, date):
+    return {'artists': [{'name': 'artist', 'uri': 'artist_uri'}],
+            'name': f'album{n}', 'uri': f'spotify:album:{n}',
+            'images': [{'url': 'art_url'}], 'release_date': date,
+            'album_type': 'album'}
+
+
+class FakeSpotify:
+    """ Two followed artists over cursor pages of one, with releases """
+
+    def __init__(self, releases):
+        self.releases = releases
+        self.album_calls = []
+
+    def current_user_followed_artists(self, limit=20, after=None):
+        n = 0 if after is None else int(after[1:]) + 1
+        last = n == len(self.releases) - 1
+        return {'artists': {
+            'items': [api_artist(n)],
+            'next': None if last else 'next',
+            'cursors': {'after': None if last else f'a{n}'}}}
+
+    def artist_albums(self, artist_id, album_type=None, country=None,
+                      limit=20, offset=0):
+        self.album_calls.append((artist_id, offset))
+        items = self.releases[int(artist_id[1:])]
+        return {'items': items[offset:offset + limit], 'total': len(items)}
+
+
+@pytest.fixture
+def releases():
+    return [
+        [api_release(1, '2020-01-01'), api_release(2, '2019-01-01'),
+         api_release(3, '2018-01-01')],
+        [api_release(4, '2021-01-01')],
+    ]
+
+
+def uris(items):
+    return [i['uri'] for i in items]
+
+
+def test_state_path():
+    assert following.state_path('testuser').endswith(
+        '.cache/sputils/testuser_following.json')
+
+
+def test_load_state_unusable(tmp_path):
+    path = tmp_path / 'following.json'
+    assert following.load_state(str(path)) == {}
+
+    path.write_text('{"version": 0, "artists": {"a0": {}}}')
+    assert following.load_state(str(path)) == {}
+
+
+def test_collect_followed_artists(releases):
+    sp = FakeSpotify(releases)
+
+    assert following.collect_followed_artists(sp, 1) == [
+        {'name': 'artist0', 'uri': 'spotify:artist:a0'},
+        {'name': 'artist1', 'uri': 'spotify:artist:a1'}]
+
+
+def test_collect_new_releases(tmp_path, releases):
+    path = str(tmp_path / 'following.json')
+    sp = FakeSpotify(releases)
+
+    first = following.collect_new_releases(sp, path, limit=2)
+    assert uris(first) == ['spotify:album:4', 'spotify:album:1',
+                           'spotify:album:2', 'spotify:album:3']
+    assert first[0]['release_date'] == '2021-01-01'
+    assert sorted(sp.album_calls) == [('a0', 0), ('a0', 2), ('a1', 0)]
+
+    # an artist whose first page is unchanged isn't paged through again
+    sp.album_calls = []
+    assert following.collect_new_releases(sp, path, limit=2) == []
+    assert sorted(sp.album_calls) == [('a0', 0), ('a1', 0)]
+
+    releases[0].insert(0, api_release(5, '2022-01-01'))
+    sp.album_calls = []
+    new = following.collect_new_releases(sp, path, limit=2)
+    assert uris(new) == ['spotify:album:5']
+    assert sorted(sp.album_calls) == [('a0', 0), ('a0', 2), ('a1', 0)]
+
+    refreshed = following.collect_new_releases(sp, path, limit=2,
+                                               refresh=True)
+    assert len(refreshed) == 5
+
+
+def test_new_releases_unfollowed(releases):
+    sp = FakeSpotify(releases)
+    known = {'a9': {'total': 1, 'seen': ['spotify:album:9']}}
+
+    found, state = following.new_releases(sp, ['a1'], known)
+
+    assert uris(found) == ['spotify:album:4']
+    assert state == {'a1': {'total': 1, 'seen': ['spotify:album:4']}}
+
+
+def test_new_releases_shared(releases):
+    releases[1].append(releases[0][0])
+    sp = FakeSpotify(releases)
+
+    found, _ = following.new_releases(sp, ['a0', 'a1'], {})
+
+    assert len(found) == 4
+
+
+@unittest.mock.patch('sputils.following.collect_followed_artists')
+@unittest.mock.patch('sputils.following.collect_new_releases')
+def test_follower(mock_cnr, mock_cfa):
+    sp = unittest.mock.Mock()
+
+    following.follower(sp, 'albums', 'path')
+    mock_cnr.assert_called_once()
+
+    following.follower(sp, 'artists', 'path')
+    mock_cfa.assert_called_once()
+
+    with pytest.raises(ValueError):
+        following.follower(sp, 'tracks', 'path')
@@ -0,0 +1,79 @@
+import unittest.mock
+
+import pytest
+import requests
+
+from sputils import httpcache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return httpcache.HttpCache(str(tmp_path / 'http.sqlite'))
+
+
+def make_response(status, body=b'', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+def test_cache_path():
+    assert httpcache.cache_path('testuser').endswith(
+        '.cache/sputils/testuser_http.sqlite')
+
+
+def test_get_set(cache):
+    assert cache.get('url') is None
+
+    cache.set('url', '"1"', 'application/json', b'{}')
+    assert cache.get('url') == ('"1"', 'application/json', b'{}')
+
+
+def test_evict(tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path / 'http.sqlite'), max_bytes=25)
+
+    with unittest.mock.patch('sputils.httpcache.time.time') as time_mock:
+        for n in range(4):
+            time_mock.return_value = n
+            cache.set(f'url{n}', '"1"', None, b'0123456789')
+        cache.evict()
+
+    assert [cache.get(f'url{n}') is not None for n in range(4)] == \
+        [False, False, True, True]
+
+
+@unittest.mock.patch('requests.adapters.HTTPAdapter.send')
+def test_adapter_revalidate(send_mock, cache):
+    adapter = httpcache.CachingAdapter(cache)
+    request = requests.Request('GET', 'http://api/v1/me/albums').prepare()
+
+    send_mock.return_value = make_response(200, b'{"a": 1}', {
+        'ETag': '"1"', 'Content-Type': 'application/json; charset=utf-8'})
+    response = adapter.send(request)
+    assert not response.revalidated
+    assert 'If-None-Match' not in request.headers
+
+    send_mock.return_value = make_response(304, headers={'ETag': '"1"'})
+    response = adapter.send(request)
+
+    assert request.headers['If-None-Match'] == '"1"'
+    assert response.revalidated
+    assert response.status_code == 200
+    assert response.json() == {'a': 1}
+    assert response.encoding == 'utf-8'
+
+
+@unittest.mock.patch('requests.adapters.HTTPAdapter.send')
+def test_adapter_uncached(send_mock, cache):
+    adapter = httpcache.CachingAdapter(cache)
+    url = 'http://api/v1/me/albums'
+
+    send_mock.return_value = make_response(200, b'{}')
+    adapter.send(requests.Request('GET', url).prepare())
+    assert cache.get(url) is None
+
+    send_mock.return_value = make_response(200, b'{}', {'ETag': '"1"'})
+    adapter.send(requests.Request('PUT', url).prepare())
+    assert cache.get(url) is None
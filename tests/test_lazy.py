@@ -0,0 +1,72 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from sputils import lazy
+
+# modules that should only be imported once a command actually needs them
+DEFERRED_MODULES = ('spotipy', 'requests', 'yaml', 'aiohttp', 'asyncio',
+                    'sqlite3', 'concurrent.futures', 'orjson')
+
+
+def test_lazy_module_imports_on_first_use():
+    module = lazy.LazyModule('json')
+    assert module._module is None
+
+    assert module.dumps([1]) == '[1]'
+    assert module._module is sys.modules['json']
+
+
+def test_lazy_module_imports_submodules():
+    module = lazy.LazyModule('xml')
+    assert module.dom.__name__ == 'xml.dom'
+
+
+def test_lazy_module_missing_attribute():
+    module = lazy.LazyModule('json')
+    with pytest.raises(AttributeError):
+        module.not_an_attribute
+    with pytest.raises(AttributeError):
+        module.__func__
+
+
+def test_optional_module():
+    assert lazy.optional_module('json') is sys.modules['json']
+    assert lazy.optional_module('sputils_missing_module') is None
+
+
+def test_installed():
+    assert lazy.installed('json')
+    assert not lazy.installed('sputils_missing_module')
+
+
+def run_python(*args):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in (root, env.get('PYTHONPATH')) if p)
+    return subprocess.run([sys.executable, *args], env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def test_startup_defers_heavy_imports():
+    code = ('import sys, sputils.sputils; '
+            'print(" ".join(sorted(sys.modules)))')
+    loaded = set(run_python('-c', code).stdout.split())
+
+    assert [m for m in DEFERRED_MODULES if m in loaded] == []
+
+
+def test_startup_import_time():
+    budget = float(os.environ.get('SPUTILS_IMPORT_BUDGET_MS', 200))
+    stderr = run_python('-X', 'importtime', '-c',
+                        'import sputils.sputils').stderr
+
+    # cumulative microseconds of the top level import, the last line
+    cumulative = re.findall(r'\|\s*(\d+)\s*\|\s*sputils\.sputils$', stderr,
+                            re.MULTILINE)
+    assert int(cumulative[-1]) / 1000 < budget
@@ -0,0 +1,68 @@
+import pytest
+import unittest.mock
+
+import spotipy
+
+from sputils import library
+
+
+def mock_client():
+    return unittest.mock.create_autospec(spotipy.Spotify, instance=True)
+
+
+def test_saver_albums():
+    sp = mock_client()
+    sp._get.side_effect = lambda url: [
+        int(i) % 2 == 0 for i in url.split('=')[1].split(',')]
+
+    uris = [f'spotify:album:{n}' for n in range(30)] + ['spotify:album:1']
+    saved = library.saver(sp, uris, 'albums')
+
+    assert [s['uri'] for s in saved] == uris[:30]
+    assert [s['changed'] for s in saved] == [n % 2 == 1 for n in range(30)]
+    assert sp._get.call_count == 2
+    assert sp._get.call_args[0][0].startswith('me/albums/contains?ids=')
+
+    added = [i for c in sp.current_user_saved_albums_add.call_args_list
+             for i in c[0][0]]
+    assert sorted(added, key=int) == [str(n) for n in range(1, 30, 2)]
+    sp._delete.assert_not_called()
+
+
+def test_deleter_albums():
+    sp = mock_client()
+    sp._get.return_value = [True, False]
+
+    library.deleter(sp, ['a', 'b'], 'albums')
+
+    sp._get.assert_called_once_with('me/albums/contains?ids=a,b')
+    sp._delete.assert_called_once_with('me/albums?ids=a')
+
+
+def test_deleter_tracks():
+    sp = mock_client()
+    sp.current_user_saved_tracks_contains.side_effect = lambda ids: [
+        i == 'a' for i in ids]
+
+    deleted = library.deleter(sp, ['a', 'b'], 'tracks')
+
+    assert deleted == [
+        {'uri': 'spotify:track:a', 'changed': True},
+        {'uri': 'spotify:track:b', 'changed': False},
+    ]
+    sp.current_user_saved_tracks_delete.assert_called_once_with(['a'])
+    sp.current_user_saved_tracks_add.assert_not_called()
+
+
+def test_saver_unchanged():
+    sp = mock_client()
+    sp.current_user_saved_tracks_contains.return_value = [True]
+
+    library.saver(sp, ['a'], 'tracks')
+
+    sp.current_user_saved_tracks_add.assert_not_called()
+
+
+def test_library_methods_invalid():
+    with pytest.raises(ValueError):
+        library.library_methods(unittest.mock.Mock(), 'artists')
@@ -0,0 +1,156 @@
+import os
+import unittest.mock
+
+import pytest
+
+from sputils import localsearch, records, snapshot
+
+
+def make_album(n, artist, name, tracks, added='2019-01-01T00:00:00Z'):
+    artists = records.shared_artists([(artist, f'spotify:artist:{artist}')])
+    return records.CollectedAlbum(
+        artist, name, f'spotify:album:{n}', f'art{n}',
+        f'spotify:artist:{artist}', added,
+        [records.Track(artist, 1 + i / 100, t, f'spotify:track:{n}{i}',
+                       artists)
+         for i, t in enumerate(tracks)], artists)
+
+
+@pytest.fixture
+def albums():
+    return [
+        make_album(1, 'Björk', 'Homogenic', ['Jóga', 'Bachelorette']),
+        make_album(2, 'Radiohead', 'OK Computer', ['Airbag', 'Karma Police']),
+        make_album(3, 'Radiohead', 'Kid A', ['Everything In Its Right Place',
+                                             'Idioteque']),
+    ]
+
+
+@pytest.fixture
+def index(tmp_path, albums):
+    index = localsearch.LibraryIndex(str(tmp_path / 'index.sqlite'))
+    localsearch.update_albums(index, albums)
+    return index
+
+
+def names(items):
+    return [i['name'] for i in items]
+
+
+def test_index_path():
+    assert localsearch.index_path('testuser').endswith(
+        '.cache/sputils/testuser_index.sqlite')
+
+
+def test_match_query():
+    assert localsearch.match_query('Karma  pol!') == '"karma"* "pol"*'
+    assert localsearch.match_query(' "* ') == ''
+
+
+def test_search_prefix(index):
+    assert sorted(names(localsearch.local_searcher(index, 'radio',
+                                                   'albums'))) == \
+        ['Kid A', 'OK Computer']
+    assert names(localsearch.local_searcher(index, 'kar pol', 'tracks')) == \
+        ['Karma Police']
+    assert localsearch.local_searcher(index, 'radiohead', 'artists') == [
+        {'name': 'Radiohead', 'uri': 'spotify:artist:Radiohead'}]
+
+
+def test_search_accents(index):
+    assert names(localsearch.local_searcher(index, 'bjork', 'albums')) == \
+        ['Homogenic']
+    assert names(localsearch.local_searcher(index, 'joga', 'tracks')) == \
+        ['Jóga']
+
+
+def test_search_album_name(index):
+    assert sorted(names(localsearch.local_searcher(index, 'kid',
+                                                   'tracks'))) == \
+        ['Everything In Its Right Place', 'Idioteque']
+
+
+def test_search_output(index, albums):
+    track = localsearch.local_searcher(index, 'airbag', 'tracks')[0]
+
+    assert track == {
+        'artist': 'Radiohead',
+        'track': 1.0,
+        'name': 'Airbag',
+        'uri': 'spotify:track:20',
+        'album': {
+            'name': 'OK Computer',
+            'uri': 'spotify:album:2',
+            'release_date': None,
+            'art_url': 'art2'
+        }
+    }
+
+
+def test_search_max_results(index):
+    assert len(localsearch.local_searcher(index, 'radiohead', 'tracks',
+                                          max_results=3)) == 3
+
+
+def test_search_invalid(index):
+    assert localsearch.local_searcher(index, '!', 'albums') == []
+    with pytest.raises(ValueError):
+        localsearch.local_searcher(index, 'a', 'shows')
+
+
+def test_update_incremental(index, albums):
+    changed = make_album(2, 'Radiohead', 'OK Computer OKNOTOK', ['Airbag'])
+
+    assert index.update('albums', localsearch.album_rows(
+        [albums[0], changed])['albums']) == 2
+    assert index.update('albums', localsearch.album_rows(
+        [albums[0], changed])['albums']) == 0
+
+    assert names(localsearch.local_searcher(index, 'radiohead', 'albums')) \
+        == ['OK Computer OKNOTOK']
+
+
+def test_sync_index_snapshot(tmp_path, albums):
+    index = localsearch.LibraryIndex(str(tmp_path / 'index.sqlite'))
+    path = str(tmp_path / 'albums.json')
+    snapshot.save_snapshot(path, albums)
+    sp = unittest.mock.Mock()
+
+    with unittest.mock.patch('sputils.snapshot.snapshot_path',
+                             return_value=path):
+        localsearch.sync_index(index, sp, 'testuser', 'albums')
+        assert len(localsearch.local_searcher(index, 'radiohead',
+                                              'albums')) == 2
+
+        snapshot.save_snapshot(path, albums[:1])
+        os.utime(path, (0, 0))
+        localsearch.sync_index(index, sp, 'testuser', 'tracks')
+
+    assert localsearch.local_searcher(index, 'radiohead', 'albums') == []
+    assert sp.mock_calls == []
+
+
+@unittest.mock.patch('sputils.localsearch.collect')
+def test_sync_index_playlists(collect_mock, tmp_path, playlist_dict):
+    index = localsearch.LibraryIndex(str(tmp_path / 'index.sqlite'))
+    collect_mock.collect_all_playlists.return_value = [playlist_dict]
+
+    localsearch.sync_index(index, 'sp', 'testuser', 'playlists')
+    localsearch.sync_index(index, 'sp', 'testuser', 'playlists')
+
+    collect_mock.collect_all_playlists.assert_called_once()
+    query = playlist_dict['name'][:3]
+    assert localsearch.local_searcher(index, query, 'playlists') == \
+        [playlist_dict]
+
+
+def test_update_collected_playlists(tmp_path, playlist_dict):
+    path = str(tmp_path / 'index.sqlite')
+
+    localsearch.update_collected_playlists(path, [playlist_dict])
+    assert not os.path.exists(path)
+
+    localsearch.LibraryIndex(path)
+    localsearch.update_collected_playlists(path, [playlist_dict])
+    assert len(localsearch.LibraryIndex(path).search(
+        playlist_dict['name'], 'playlists')) == 1
@@ -0,0 +1,72 @@
+import pytest
+import unittest.mock
+
+import deepdiff
+
+from sputils import query
+
+
+@pytest.mark.parametrize('uri', [
+    'spotify:track:abc',
+    'https://open.spotify.com/track/abc?si=xyz',
+    'https://open.spotify.com/track/abc/',
+    'abc',
+])
+def test_uri_to_id(uri):
+    assert query.uri_to_id(uri) == 'abc'
+
+
+def test_chunks():
+    assert query.chunks([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+
+
+def test_querier_tracks(api_track_searched, track_dict_searched):
+    sp = unittest.mock.Mock()
+    sp.tracks.side_effect = lambda ids: {
+        'tracks': [None if i == 'missing' else
+                   {**api_track_searched, 'uri': i} for i in ids]}
+
+    uris = [f'spotify:track:{n % 60}' for n in range(120)] + ['missing']
+    tracks = query.querier(sp, uris, 'tracks')
+
+    assert [t['uri'] for t in tracks] == [str(n) for n in range(60)]
+    assert deepdiff.DeepDiff(tracks[0], {**track_dict_searched,
+                                         'uri': '0'}) == {}
+    assert sp.tracks.call_count == 2
+
+
+def test_querier_albums(api_album_searched):
+    sp = unittest.mock.Mock()
+    sp.albums.side_effect = lambda ids: {
+        'albums': [{**api_album_searched, 'uri': i} for i in ids]}
+
+    uris = [str(n) for n in range(45)]
+    albums = query.querier(sp, uris, 'albums')
+
+    assert [a['uri'] for a in albums] == uris
+    assert sp.albums.call_count == 3
+
+
+def test_querier_artists(api_artist_searched, artist_dict_searched):
+    sp = unittest.mock.Mock()
+    sp.artists.return_value = {'artists': [api_artist_searched]}
+
+    artists = query.querier(sp, ['a'], 'artists')
+
+    assert deepdiff.DeepDiff(artists, [artist_dict_searched]) == {}
+
+
+def test_querier_playlists(api_playlist, playlist_dict):
+    sp = unittest.mock.Mock()
+    sp.user_playlist.return_value = api_playlist
+
+    playlists = query.querier(sp, ['a', 'b', 'a'], 'playlists', 'testuser')
+
+    assert deepdiff.DeepDiff(playlists, [playlist_dict] * 2) == {}
+    sp.user_playlist.assert_any_call('testuser', 'a')
+    assert sp.user_playlist.call_count == 2
+
+
+def test_querier_invalid():
+    with pytest.raises(ValueError):
+        query.querier(unittest.mock.Mock(), ['a'], 'test')
@@ -0,0 +1,157 @@
+import time
+import unittest.mock
+
+import pytest
+import requests
+
+from sputils import auth, ratelimit, stats
+
+
+class ApiError(Exception):
+    def __init__(self, http_status, headers=None):
+        self.http_status = http_status
+        self.headers = headers
+
+
+def test_retry_after():
+    assert ratelimit.retry_after(ApiError(429, {'Retry-After': '3'})) == 3
+    assert ratelimit.retry_after(ApiError(429)) == 1
+    assert ratelimit.retry_after(ApiError(500)) is None
+    assert ratelimit.retry_after(ValueError()) is None
+
+
+@pytest.mark.parametrize('exc,expected', [
+    (ApiError(429), True),
+    (ApiError(503), True),
+    (ApiError(404), False),
+    (ConnectionError(), True),
+    (ValueError(), False),
+])
+def test_is_retryable(exc, expected):
+    assert ratelimit.is_retryable(exc) == expected
+
+
+def test_token_bucket_pause():
+    bucket = ratelimit.TokenBucket()
+    assert bucket.reserve() == 0
+
+    bucket.pause(10)
+    assert bucket.reserve() > 9
+
+
+def test_token_bucket_rate():
+    bucket = ratelimit.TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0 < bucket.reserve() <= 0.1
+
+
+def test_aimd_limiter():
+    limiter = ratelimit.AIMDLimiter(8, initial=4)
+
+    limiter.acquire()
+    limiter.release(1)
+    assert limiter.limit == 4.25
+
+    limiter.acquire()
+    limiter.release(1, throttled=True)
+    assert limiter.limit == 2.125
+
+    limiter.acquire()
+    limiter.release(10)
+    assert limiter.limit == 1.0625
+
+
+@unittest.mock.patch('sputils.ratelimit.time.sleep')
+def test_scheduler_call_retries(mock_sleep):
+    func = unittest.mock.Mock(side_effect=[
+        ApiError(429, {'Retry-After': '0'}), ApiError(502), 'page'])
+    scheduler = ratelimit.Scheduler(4)
+
+    assert scheduler.call(func, 1, 2) == 'page'
+    assert func.call_count == 3
+    func.assert_called_with(1, 2)
+
+
+@unittest.mock.patch('sputils.ratelimit.time.sleep')
+def test_scheduler_call_gives_up(mock_sleep):
+    func = unittest.mock.Mock(side_effect=ApiError(500))
+    scheduler = ratelimit.Scheduler(4, retries=2)
+
+    with pytest.raises(ApiError):
+        scheduler.call(func)
+    assert func.call_count == 3
+
+
+def test_scheduler_call_not_retryable():
+    func = unittest.mock.Mock(side_effect=ApiError(404))
+    scheduler = ratelimit.Scheduler(4)
+
+    with pytest.raises(ApiError):
+        scheduler.call(func)
+    func.assert_called_once()
+
+
+def test_scheduler_map():
+    scheduler = ratelimit.Scheduler(4)
+
+    def fetch(limit, offset):
+        time.sleep(0.01 * (3 - offset))
+        return offset
+
+    pages = list(scheduler.map(fetch, [(1, 0), (1, 1), (1, 2)], True))
+
+    assert pages == [0, 1, 2]
+
+
+class ThrottlingAdapter(requests.adapters.HTTPAdapter):
+    """ Answers the first GET with a 429 and the rest with an empty page """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        if self.sent == 1:
+            response.status_code = 429
+            response.headers['Retry-After'] = '0'
+            response._content = b'{"error": {"message": "throttled"}}'
+        else:
+            response.status_code = 200
+            response._content = b'{"items": [], "total": 0}'
+        return response
+
+
+@unittest.mock.patch('sputils.ratelimit.time.sleep')
+def test_scheduler_sees_client_429(mock_sleep, capsys):
+    adapter = ThrottlingAdapter()
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    token_manager = auth.TokenManager(auth.StaticCredentials('token'))
+    sp = auth.get_spotify_client('user', 'id', 'secret', session=session,
+                                 token_manager=token_manager)
+
+    events = []
+
+    def record(event, fields):
+        events.append((event, fields))
+
+    stats.subscribe(record)
+    try:
+        scheduler = ratelimit.Scheduler()
+        page = scheduler.call(sp.current_user_saved_albums, 1)
+    finally:
+        stats.unsubscribe(record)
+
+    assert page == {'items': [], 'total': 0}
+    assert adapter.sent == 2
+    assert [e for e, _ in events] == ['retry']
+    assert events[0][1]['error'].http_status == 429
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from sputils import records
+
+
+@pytest.fixture
+def album(album_dict_collected):
+    return records.CollectedAlbum.from_dict(album_dict_collected)
+
+
+def test_record_mapping(album, album_dict_collected):
+    assert album['name'] == 'album'
+    assert set(album) == set(album_dict_collected)
+    assert len(album) == len(album_dict_collected)
+    assert album.get('missing') is None
+
+    with pytest.raises(KeyError):
+        album['missing']
+
+
+def test_hidden_fields(album_dict_collected):
+    artists = records.shared_artists([('artist1', 'artist1_uri')])
+    album = records.CollectedAlbum.from_dict(
+        {**album_dict_collected, 'artists': [['artist1', 'artist1_uri']]})
+
+    assert album['artists'] is artists
+    assert 'artists' not in set(album) and 'artists' not in album.to_dict()
+    assert album.to_dict(hidden=True)['artists'] == artists
+    assert 'artists' in album.to_dict(hidden=True)['tracks'][0]
+
+
+def test_shared_artists():
+    artists = records.shared_artists([('a', 'a_uri'), ('b', None)])
+
+    assert artists == (('a', 'a_uri'), ('b', None))
+    assert records.shared_artists([['a', 'a_uri'], ['b', None]]) is artists
+
+
+def test_record_slots(album):
+    assert not hasattr(album, '__dict__')
+
+    with pytest.raises(AttributeError):
+        album.extra = 1
+
+
+def test_to_dict(album, album_dict_collected):
+    assert album.to_dict() == album_dict_collected
+    assert type(album.to_dict()['tracks'][0]) is dict
+
+
+def test_collected_track(album, track_dict_collected):
+    track = records.CollectedTrack(album.tracks[0], album)
+
+    assert track.to_dict() == {
+        **track_dict_collected,
+        'albumartist': 'artist1, artist2',
+        'album': 'album',
+        'added': 'mtime',
+        'art_url': 'art_url',
+    }
+    assert '{name} - {album}'.format(**track) == 'track - album'
+
+
+def test_to_builtin(album, album_dict_collected):
+    dumped = json.dumps({'albums': [album]}, default=records.to_builtin)
+
+    assert json.loads(dumped) == {'albums': [album_dict_collected]}
+
+    with pytest.raises(TypeError):
+        records.to_builtin(object())
+
+
+def test_builtin_value(album, album_dict_collected):
+    value = records.builtin_value({'albums': [album], 'count': 1})
+
+    assert value == {'albums': [album_dict_collected], 'count': 1}
+    assert type(value['albums'][0]) is dict
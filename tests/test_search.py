@@ -2,6 +2,7 @@ import pytest
 import unittest.mock
 
 import deepdiff
+import spotipy
 
 from sputils import search
 
@@ -64,6 +65,54 @@ def test_search_playlists(sp_mock, api_playlist, playlist_dict):
     assert deepdiff.DeepDiff(searched, expected) == {}
 
 
+def test_search_pages():
+    assert search.search_pages(50, 500) == []
+    assert search.search_pages(120, 500) == [(50, 50), (20, 100)]
+    assert search.search_pages(500, 120) == [(50, 50), (20, 100)]
+    assert search.search_pages(5000, 5000)[-1] == (50, 950)
+
+
+def test_iter_search_pages(api_album_searched, album_dict_searched):
+    def mock_search(qry, limit, offset, type):
+        items = [{**api_album_searched, 'uri': str(n % 100)}
+                 for n in range(offset, min(offset + limit, 130))]
+        return {'albums': {'items': items, 'total': 130}}
+
+    sp = unittest.mock.Mock()
+    sp.search.side_effect = mock_search
+
+    albums = list(search.iter_search(sp, 'test', 'album',
+                                     search.album_to_dict_searched, 200))
+
+    assert [a['uri'] for a in albums] == [str(n) for n in range(100)]
+    assert deepdiff.DeepDiff(albums[0], {**album_dict_searched,
+                                         'uri': '0'}) == {}
+    assert sp.search.call_count == 3
+
+
+def test_iter_search_max_results(api_album_searched):
+    sp = unittest.mock.Mock()
+    sp.search.return_value = {
+        'albums': {'items': [api_album_searched] * 10, 'total': 100}}
+
+    albums = list(search.iter_search(sp, 'test', 'album',
+                                     search.album_to_dict_searched, 10))
+
+    assert len(albums) == 1
+    sp.search.assert_called_once_with('test', limit=10, offset=0,
+                                      type='album')
+
+
+def test_iter_searcher(sp_mock, playlist_dict):
+    sp = sp_mock.Spotify()
+
+    playlists = list(search.iter_searcher(sp, 'test', 'playlists'))
+    assert deepdiff.DeepDiff(playlists, [playlist_dict]) == {}
+
+    with pytest.raises(ValueError):
+        search.iter_searcher(sp, 'test', 'test')
+
+
 @unittest.mock.patch('sputils.search.search_albums')
 @unittest.mock.patch('sputils.search.search_tracks')
 @unittest.mock.patch('sputils.search.search_artists')
@@ -85,3 +134,70 @@ def test_searcher(mock_sp, mock_sar, mock_st, mock_sa, sp_mock):
 
     with pytest.raises(ValueError) as e:
         search.searcher(sp, 'test', 'test')
+
+
+def test_normalize_query():
+    assert search.normalize_query('  artist -  title ') == 'artist - title'
+
+
+def test_batch_searcher(api_track_searched, track_dict_searched):
+    sp = unittest.mock.Mock()
+    sp.search.side_effect = lambda qry, limit, offset, type: {
+        'tracks': {'items': [{**api_track_searched, 'uri': qry}]}}
+
+    queries = ['a', 'b', ' a ', '', 'c', 'a']
+    tracks = search.batch_searcher(sp, queries, 'tracks')
+
+    assert [(t['query'], t['uri']) for t in tracks] == [
+        ('a', 'a'), ('b', 'b'), (' a ', 'a'), ('c', 'c')]
+    assert deepdiff.DeepDiff(tracks[0], {**track_dict_searched, 'uri': 'a',
+                                         'query': 'a'}) == {}
+    assert sp.search.call_count == 3
+
+
+def test_batch_searcher_pages(api_track_searched):
+    sp = unittest.mock.Mock()
+    sp.search.side_effect = lambda qry, limit, offset, type: {
+        'tracks': {'total': 120, 'items': [
+            {**api_track_searched, 'uri': f'{qry}{offset + n}'}
+            for n in range(limit)]}}
+
+    tracks = search.batch_searcher(sp, ['a', 'b'], 'tracks', 120)
+
+    assert [t['uri'] for t in tracks] == (
+        [f'a{n}' for n in range(120)] + [f'b{n}' for n in range(120)])
+    assert sp.search.call_count == 6
+
+
+def test_batch_searcher_failed(api_track_searched):
+    error = spotipy.client.SpotifyException(404, -1, 'not found')
+
+    def search_(qry, limit, offset, type):
+        if qry == 'b':
+            raise error
+        return {'tracks': {'items': [{**api_track_searched, 'uri': qry}]}}
+
+    sp = unittest.mock.Mock()
+    sp.search.side_effect = search_
+    on_error = unittest.mock.Mock()
+
+    tracks = search.batch_searcher(sp, ['a', 'b', ' b', 'c'], 'tracks',
+                                   on_error=on_error)
+
+    assert [t['uri'] for t in tracks] == ['a', 'c']
+    assert on_error.call_args_list == [
+        unittest.mock.call('b', error), unittest.mock.call(' b', error)]
+
+
+def test_batch_searcher_reports(api_track_searched, capsys):
+    sp = unittest.mock.Mock()
+    sp.search.side_effect = spotipy.client.SpotifyException(
+        404, -1, 'not found')
+
+    assert search.batch_searcher(sp, ['a'], 'tracks') == []
+    assert "search failed for 'a'" in capsys.readouterr().err
+
+
+def test_batch_searcher_invalid():
+    with pytest.raises(ValueError):
+        search.batch_searcher(unittest.mock.Mock(), ['a'], 'test')
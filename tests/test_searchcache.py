@@ -0,0 +1,83 @@
+import unittest.mock
+
+import pytest
+
+from sputils import searchcache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return searchcache.SearchCache(str(tmp_path / 'search.sqlite'))
+
+
+def test_cache_path():
+    assert searchcache.cache_path().endswith('.cache/sputils/search.sqlite')
+
+
+def test_key_normalized():
+    key = searchcache.SearchCache.key
+    assert key(' Artist  Title', 'track', None, 50, 0) == \
+        key('artist title', 'track', None, 50, 0)
+    assert key('a', 'track', None, 50, 0) != key('a', 'track', None, 50, 50)
+    assert key('a', 'track', None, 50, 0) != key('a', 'album', None, 50, 0)
+
+
+def test_get_set(cache):
+    assert cache.get('key') is None
+
+    cache.set('key', {'tracks': {'items': []}})
+
+    assert cache.get('key') == {'tracks': {'items': []}}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired(tmp_path):
+    cache = searchcache.SearchCache(str(tmp_path / 'search.sqlite'), ttl=-1)
+
+    cache.set('key', {})
+
+    assert cache.get('key') is None
+
+
+def test_lru_eviction(tmp_path):
+    path = str(tmp_path / 'search.sqlite')
+    cache = searchcache.SearchCache(path, max_entries=2)
+
+    with unittest.mock.patch('sputils.searchcache.time.time') as mock_time:
+        mock_time.return_value = 1
+        cache.set('a', 1)
+        mock_time.return_value = 2
+        cache.set('b', 2)
+        mock_time.return_value = 3
+        cache.get('a')
+        mock_time.return_value = 4
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+
+def test_caching_client(cache):
+    sp = unittest.mock.Mock()
+    sp.search.return_value = {'tracks': {'items': []}}
+    client = searchcache.CachingClient(sp, cache)
+
+    assert client.search('a', limit=50) == sp.search.return_value
+    assert client.search('a', limit=50) == sp.search.return_value
+    sp.search.assert_called_once_with('a', limit=50, offset=0, type='track',
+                                      market=None)
+
+    assert client.tracks == sp.tracks
+
+
+def test_caching_client_refresh(cache):
+    sp = unittest.mock.Mock()
+    sp.search.return_value = {}
+    client = searchcache.CachingClient(sp, cache, refresh=True)
+
+    client.search('a')
+    client.search('a')
+
+    assert sp.search.call_count == 2
+    assert cache.misses == 0
@@ -0,0 +1,51 @@
+import deepdiff
+
+from sputils import collect, records, snapshot
+
+
+def test_snapshot_path():
+    path = snapshot.snapshot_path('testuser')
+
+    assert path.endswith('.cache/sputils/testuser_albums.json')
+
+
+def test_save_load_snapshot(tmp_path, album_dict_collected):
+    path = str(tmp_path / 'albums.json')
+    expected = [album_dict_collected]
+
+    snapshot.save_snapshot(path, expected)
+    albums = snapshot.load_snapshot(path)
+
+    assert deepdiff.DeepDiff(records.builtin_value(albums), expected) == {}
+
+
+def test_save_load_snapshot_artists(tmp_path, api_album_collected):
+    path = str(tmp_path / 'albums.json')
+    album = collect.album_to_record_collected(api_album_collected)
+
+    snapshot.save_snapshot(path, [album])
+    loaded, = snapshot.load_snapshot(path)
+
+    assert loaded['artists'] is album['artists']
+    assert loaded['tracks'][0]['artists'] is album['tracks'][0]['artists']
+
+
+def test_load_snapshot_missing(tmp_path):
+    assert snapshot.load_snapshot(str(tmp_path / 'missing.json')) == []
+
+
+def test_load_snapshot_wrong_version(tmp_path):
+    path = tmp_path / 'albums.json'
+    path.write_text('{"version": 0, "albums": [{"uri": "uri"}]}')
+
+    assert snapshot.load_snapshot(str(path)) == []
+
+
+def test_clear_snapshot(tmp_path, album_dict_collected):
+    path = str(tmp_path / 'albums.json')
+
+    snapshot.save_snapshot(path, [album_dict_collected])
+    snapshot.clear_snapshot(path)
+    snapshot.clear_snapshot(path)
+
+    assert snapshot.load_snapshot(path) == []
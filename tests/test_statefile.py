@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from sputils import statefile
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'state.json')
+
+    statefile.save(path, 2, {'items': [1, 2]})
+
+    assert statefile.load(path, 2) == {'version': 2, 'items': [1, 2]}
+    assert os.listdir(str(tmp_path)) == ['state.json']
+
+
+@pytest.mark.parametrize('content', ['', '[]', '{"items": []}',
+                                     '{"version": 1, "items": []}'])
+def test_load_unusable(tmp_path, content):
+    path = tmp_path / 'state.json'
+    path.write_text(content)
+
+    assert statefile.load(str(path), 2) is None
+
+
+def test_load_missing(tmp_path):
+    assert statefile.load(str(tmp_path / 'missing.json'), 1) is None
@@ -0,0 +1,172 @@
+import datetime
+import io
+import json
+import time
+import unittest.mock
+
+import pytest
+
+from sputils import ratelimit, stats
+
+
+@pytest.fixture
+def events():
+    received = []
+
+    def callback(event, fields):
+        received.append((event, fields))
+
+    stats.subscribe(callback)
+    yield received
+    stats.unsubscribe(callback)
+
+
+def test_phase_disabled():
+    assert isinstance(stats.phase('fetch'), stats.NullContext)
+    out = io.StringIO()
+    with stats.timed_writer(out) as timed:
+        assert timed is out
+    items = iter([1])
+    assert stats.timed_items(items, 'fetch') is items
+
+
+def test_phase_nested(events):
+    with stats.phase('fetch'):
+        time.sleep(0.02)
+        with stats.phase('sort'):
+            time.sleep(0.02)
+
+    (_, sort), (_, fetch) = events
+    assert sort['name'] == 'sort' and fetch['name'] == 'fetch'
+    assert 0.02 <= sort['seconds'] < 0.04
+    assert 0.02 <= fetch['seconds'] < 0.04
+
+
+def test_timed_items(events):
+    def fetch():
+        for n in range(2):
+            time.sleep(0.02)
+            with stats.phase('transform'):
+                time.sleep(0.01)
+            yield n
+
+    with stats.phase('format'):
+        items = list(stats.timed_items(fetch(), 'fetch'))
+        time.sleep(0.01)
+
+    assert items == [0, 1]
+    phases = {}
+    for _, e in events:
+        phases[e['name']] = phases.get(e['name'], 0) + e['seconds']
+    assert 0.04 <= phases['fetch'] < 0.06
+    assert 0.02 <= phases['transform'] < 0.04
+    assert 0.01 <= phases['format'] < 0.02
+
+
+def test_timed_items_closed(events):
+    def fetch():
+        yield 0
+        yield 1
+
+    items = stats.timed_items(fetch(), 'fetch')
+    next(items)
+    items.close()
+    items.close()
+
+    assert [e['name'] for _, e in events] == ['fetch']
+    with pytest.raises(StopIteration):
+        next(items)
+
+
+def test_timed_writer(events):
+    out = io.StringIO()
+    with stats.phase('format'), stats.timed_writer(out) as timed:
+        timed.write('a')
+        timed.write('b')
+        timed.flush()
+
+    assert out.getvalue() == 'ab'
+    assert [e[1]['name'] for e in events] == ['write', 'format']
+
+
+def test_response_hook(events):
+    response = unittest.mock.Mock(content=b'1234', status_code=200,
+                                  url='http://api/v1/me/albums',
+                                  revalidated=False)
+    response.elapsed = datetime.timedelta(milliseconds=20)
+    response.request.method = 'GET'
+
+    stats.response_hook(response)
+
+    event, fields = events[0]
+    assert event == 'request'
+    assert fields['bytes'] == 4
+    assert fields['status'] == 200
+    assert fields['seconds'] >= 0.02
+
+    response.revalidated = True
+    stats.response_hook(response)
+
+    assert events[1][1]['status'] == 304
+    assert events[1][1]['bytes'] == 0
+
+
+@unittest.mock.patch('sputils.ratelimit.time.sleep')
+def test_scheduler_retry(sleep_mock, events):
+    error = Exception('throttled')
+    error.http_status = 429
+    error.headers = {'Retry-After': '0'}
+    func = unittest.mock.Mock(side_effect=[error, 'ok'])
+
+    assert ratelimit.Scheduler().call(func) == 'ok'
+    assert events == [('retry', {'error': error, 'attempt': 0})]
+
+
+def record_events(recorder):
+    for ms, status in [(3, 200), (40, 200), (45, 200), (2000, 429)]:
+        recorder('request', {'method': 'GET', 'url': 'u', 'status': status,
+                             'seconds': ms / 1000, 'bytes': 100})
+    recorder('retry', {'error': None, 'attempt': 0})
+    recorder('phase', {'name': 'fetch', 'seconds': 1.5})
+    recorder('phase', {'name': 'transform', 'seconds': 0.25})
+    recorder('phase', {'name': 'transform', 'seconds': 0.25})
+    for hit in [True, True, False]:
+        recorder('cache', {'name': 'search', 'hit': hit})
+
+
+def test_recorder():
+    recorder = stats.Recorder()
+    record_events(recorder)
+
+    report = recorder.to_dict()
+
+    assert report['requests'] == 4
+    assert report['statuses'] == {'200': 3, '429': 1}
+    assert report['throttled'] == 1
+    assert report['retries'] == 1
+    assert report['bytes'] == 400
+    assert report['latency_ms'] == {'p50': 45, 'p90': 2000, 'p99': 2000,
+                                    'max': 2000}
+    assert report['histogram']['<=5ms'] == 1
+    assert report['histogram']['<=50ms'] == 2
+    assert report['histogram']['<=2500ms'] == 1
+    assert report['phases'] == {'fetch': {'seconds': 1.5, 'calls': 1},
+                                'transform': {'seconds': 0.5, 'calls': 2}}
+    assert report['caches'] == {'search': {'hits': 2, 'misses': 1}}
+
+
+def test_recorder_report():
+    recorder = stats.Recorder()
+    record_events(recorder)
+
+    assert json.loads(recorder.report('json')) == recorder.to_dict()
+
+    table = recorder.report()
+    assert 'requests    4 (200: 3, 429: 1)' in table
+    assert 'transform        0.500        2' in table
+    assert 'cache       search: 2 hits, 1 misses' in table
+
+
+def test_recorder_empty():
+    report = stats.Recorder().report()
+    assert report.startswith('requests    0 (none)')